@@ -0,0 +1,311 @@
+"""Local stand-in for WhatsApp Web, for benchmarking WhatsAppService offline.
+
+It serves one page that renders the elements the service relies on: the QR
+canvas, #pane-side, the search box (data-tab="3"), the New chat button, the
+composer (data-tab="10"), the Attach button and media input, the send icon,
+outgoing messages with clock/tick icons, the chat list with each chat's
+last status icon, and the invalid-number dialog.
+Latency and failures are injected from the command line.
+
+    python fake_whatsapp.py --port 8765 --chat-ms 800 --invalid-rate 0.1
+"""
+import argparse
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MEDIA_ACCEPT = "image/*,video/mp4,video/3gpp,video/quicktime"
+
+DEFAULTS = {
+    "login_ms": 0,          # How long the QR shows on the first load before "linking"
+    "boot_ms": 300,         # App start-up time on every full page load
+    "chat_ms": 500,         # Time to open a chat
+    "jitter_ms": 200,       # Random extra added to every latency
+    "search_ms": 150,       # New-chat search result latency
+    "upload_ms": 400,       # Media preview latency
+    "deliver_ms": 300,      # Clock icon until one tick (two ticks after twice as long again)
+    "invalid_rate": 0.0,    # Share of numbers reported invalid
+    "stuck_rate": 0.0,      # Share of messages that never leave the clock state
+    "rate_limit_after": 0,  # Show a rate-limit banner after this many sends (0 = never)
+}
+
+PAGE = r"""<!doctype html>
+<html><head><meta charset="utf-8"><title>WhatsApp (fake)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; display: flex; height: 100vh; }
+  #side { width: 30%; border-right: 1px solid #ccc; }
+  #app-main { flex: 1; display: flex; flex-direction: column; }
+  #main { flex: 1; display: flex; flex-direction: column; }
+  .messages { flex: 1; overflow: auto; }
+  [contenteditable] { border: 1px solid #999; min-height: 24px; padding: 4px; }
+  [data-icon] { display: inline-block; min-width: 24px; min-height: 24px; cursor: pointer; }
+  #preview { position: fixed; inset: 20%; background: #eee; border: 1px solid #333; }
+</style></head>
+<body>
+<div id="root"></div>
+<script>
+var CONFIG = __CONFIG__;
+var ACCEPT = __ACCEPT__;
+var sends = 0;
+
+function later(ms, fn) { setTimeout(fn, ms + Math.random() * CONFIG.jitter_ms); }
+function hash(text) {
+  var h = 2166136261;
+  for (var i = 0; i < text.length; i++) { h ^= text.charCodeAt(i); h = Math.imul(h, 16777619) >>> 0; }
+  return h / 4294967296;
+}
+function isInvalid(digits) { return hash('invalid:' + digits) < CONFIG.invalid_rate; }
+function el(tag, attrs, children) {
+  var node = document.createElement(tag);
+  Object.keys(attrs || {}).forEach(function (k) { node.setAttribute(k, attrs[k]); });
+  (children || []).forEach(function (c) { node.appendChild(typeof c === 'string' ? document.createTextNode(c) : c); });
+  return node;
+}
+function root() { return document.getElementById('root'); }
+
+function showQr() {
+  var canvas = el('canvas', {'aria-label': 'Scan this QR code to link a device!', width: 264, height: 264});
+  var ctx = canvas.getContext('2d');
+  for (var i = 0; i < 400; i++) {
+    ctx.fillStyle = Math.random() < 0.5 ? '#000' : '#fff';
+    ctx.fillRect((i % 20) * 13, Math.floor(i / 20) * 13, 13, 13);
+  }
+  root().appendChild(el('div', {'data-ref': 'fake-' + Date.now()}, [canvas]));
+}
+
+function showApp() {
+  root().innerHTML = '';
+  var search = el('div', {contenteditable: 'true', 'data-tab': '3', id: 'side-search'});
+  var side = el('div', {id: 'side'}, [
+    el('header', {}, [
+      el('img', {alt: 'me'}),
+      el('div', {title: 'New chat', id: 'new-chat'}, [el('span', {'data-icon': 'chat'}, ['+'])])
+    ]),
+    search,
+    el('div', {id: 'pane-side'}, [])
+  ]);
+  root().appendChild(side);
+  root().appendChild(el('div', {id: 'app-main'}));
+  document.getElementById('new-chat').addEventListener('click', openDrawer);
+
+  var phone = new URLSearchParams(location.search).get('phone');
+  if (phone) {
+    later(CONFIG.chat_ms, function () {
+      if (isInvalid(phone)) { showInvalid(); } else { openChat(phone); }
+    });
+  }
+}
+
+function showInvalid() {
+  root().appendChild(el('div', {role: 'dialog'}, [el('div', {}, ['Phone number shared via url is invalid.'])]));
+}
+
+function openDrawer() {
+  var old = document.getElementById('side-search');
+  if (old) { old.remove(); }
+  var drawer = el('div', {id: 'drawer'});
+  var box = el('div', {contenteditable: 'true', 'data-tab': '3'});
+  var results = el('div', {id: 'results'});
+  drawer.appendChild(box);
+  drawer.appendChild(results);
+  document.getElementById('side').insertBefore(drawer, document.getElementById('pane-side'));
+  box.addEventListener('input', function () {
+    var digits = box.innerText.replace(/\D/g, '');
+    later(CONFIG.search_ms, function () {
+      results.innerHTML = '';
+      if (!digits) { return; }
+      if (isInvalid(digits)) {
+        results.appendChild(el('div', {}, ['No results found']));
+      } else {
+        results.appendChild(el('div', {role: 'listitem'}, [el('span', {title: '+' + digits}, ['+' + digits])]));
+      }
+    });
+  });
+  box.addEventListener('keydown', function (e) {
+    if (e.key !== 'Enter') { return; }
+    e.preventDefault();
+    var hit = results.querySelector('span[title]');
+    if (!hit) { return; }
+    var digits = hit.getAttribute('title').replace(/\D/g, '');
+    closeDrawer();
+    later(CONFIG.chat_ms / 4, function () { openChat(digits); });
+  });
+  box.focus();
+}
+
+function closeDrawer() {
+  var drawer = document.getElementById('drawer');
+  if (drawer) { drawer.remove(); }
+  if (!document.getElementById('side-search')) {
+    document.getElementById('side').insertBefore(
+      el('div', {contenteditable: 'true', 'data-tab': '3', id: 'side-search'}),
+      document.getElementById('pane-side'));
+  }
+}
+
+function chatRow(digits) {
+  // Most recent chat first, showing its last message's status icon
+  var pane = document.getElementById('pane-side');
+  var old = pane.querySelector('[data-chat="' + digits + '"]');
+  if (old) { old.remove(); }
+  var status = el('span', {'data-icon': 'status-time'});
+  var row = el('div', {role: 'listitem', 'data-chat': digits}, [el('span', {title: '+' + digits}, ['+' + digits]), status]);
+  pane.insertBefore(row, pane.firstChild);
+  while (pane.children.length > 20) { pane.removeChild(pane.lastChild); }
+  return status;
+}
+
+function composer(onSend) {
+  var box = el('div', {contenteditable: 'true', 'data-tab': '10', role: 'textbox'});
+  var holder = el('span', {});
+  function refresh() {
+    holder.innerHTML = '';
+    if (box.innerText.trim()) {
+      var send = el('span', {'data-icon': 'send'}, ['>']);
+      send.addEventListener('click', onSend);
+      holder.appendChild(send);
+    }
+  }
+  box.addEventListener('paste', function (e) {
+    e.preventDefault();
+    var text = e.clipboardData.getData('text/plain');
+    text.split('\n').forEach(function (line) { box.appendChild(el('p', {}, [line])); });
+    refresh();
+  });
+  box.addEventListener('input', refresh);
+  box.addEventListener('keydown', function (e) {
+    if (e.key === 'Enter' && !e.shiftKey) { e.preventDefault(); onSend(); }
+  });
+  return {box: box, holder: holder, refresh: refresh};
+}
+
+function openChat(digits) {
+  var main = el('div', {id: 'main'});
+  var messages = el('div', {'class': 'messages'});
+  var footer = el('footer', {});
+  var attach = el('div', {title: 'Attach'}, [el('span', {'data-icon': 'clip'}, ['@'])]);
+  var input = el('input', {type: 'file', accept: ACCEPT, style: 'display:none'});
+  main.appendChild(el('header', {}, [el('span', {}, ['+' + digits])]));
+  main.appendChild(messages);
+  main.appendChild(footer);
+
+  function deliver(text) {
+    sends += 1;
+    var icon = el('span', {'data-icon': 'msg-time'});
+    var out = el('div', {'class': 'message-out'}, [el('span', {}, [text]), icon]);
+    messages.appendChild(out);
+    if (CONFIG.rate_limit_after && sends >= CONFIG.rate_limit_after) {
+      document.body.appendChild(el('div', {}, ["You're sending too many messages. Try again later"]));
+    }
+    var status = chatRow(digits);
+    if (hash('stuck:' + digits + ':' + sends) >= CONFIG.stuck_rate) {
+      later(CONFIG.deliver_ms, function () {
+        icon.setAttribute('data-icon', 'msg-check');
+        status.setAttribute('data-icon', 'status-check');
+        later(CONFIG.deliver_ms * 2, function () {
+          icon.setAttribute('data-icon', 'msg-dblcheck');
+          status.setAttribute('data-icon', 'status-dblcheck');
+        });
+      });
+    }
+  }
+
+  var chat = composer(function () {
+    var text = chat.box.innerText.trim();
+    if (!text) { return; }
+    chat.box.innerHTML = '';
+    chat.refresh();
+    deliver(text);
+  });
+  footer.appendChild(attach);
+  footer.appendChild(input);
+  footer.appendChild(chat.box);
+  footer.appendChild(chat.holder);
+
+  attach.addEventListener('click', function () { input.style.display = 'inline'; });
+  input.addEventListener('change', function () {
+    var name = input.files.length ? input.files[0].name : 'file';
+    later(CONFIG.upload_ms, function () {
+      chat.box.remove();
+      var preview = el('div', {id: 'preview'}, [el('div', {}, ['Preview: ' + name])]);
+      var caption = composer(function () {
+        var text = caption.box.innerText.trim();
+        preview.remove();
+        footer.insertBefore(chat.box, chat.holder);
+        input.value = '';
+        deliver('[' + name + '] ' + text);
+      });
+      var send = el('span', {'data-icon': 'send'}, ['>']);
+      send.addEventListener('click', function () { caption.box.dispatchEvent(new KeyboardEvent('keydown', {key: 'Enter'})); });
+      preview.appendChild(caption.box);
+      preview.appendChild(send);
+      document.body.appendChild(preview);
+    });
+  });
+
+  var slot = document.getElementById('app-main');
+  slot.innerHTML = '';
+  slot.appendChild(main);
+}
+
+if (CONFIG.login_ms && !localStorage.getItem('linked')) {
+  showQr();
+  later(CONFIG.login_ms, function () { localStorage.setItem('linked', '1'); showApp(); });
+} else {
+  later(CONFIG.boot_ms, showApp);
+}
+</script>
+</body></html>
+"""
+
+
+def make_handler(config):
+    """Request handler serving the fake app with `config` baked in."""
+    page = (PAGE.replace("__CONFIG__", json.dumps(config))
+                .replace("__ACCEPT__", json.dumps(MEDIA_ACCEPT))
+                .encode("utf-8"))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/send"):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(port=0, **overrides):
+    """Serve the fake app in a background thread; returns (server, base_url)."""
+    config = dict(DEFAULTS, **overrides)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    for key, value in DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(dict(DEFAULTS, **args)))
+    print(f"Fake WhatsApp Web on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
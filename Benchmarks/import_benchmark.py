@@ -0,0 +1,60 @@
+"""Measure how long `import whatsapp_service` takes in a fresh interpreter.
+
+Each run starts a new Python process, so nothing is cached in memory
+between runs (byte-code caches on disk are warmed first). "lazy" is the
+import as shipped. "eager" also imports the heavy dependencies right away,
+as the module used to do, which is what a status-only process paid before.
+
+    python import_benchmark.py --variant Cloud --runs 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "openpyxl", "selenium.webdriver", "webdriver_manager.chrome")
+
+PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+import whatsapp_service
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - started
+loaded = [m for m in ("pandas", "openpyxl", "selenium", "webdriver_manager") if m in sys.modules]
+print(json.dumps({"seconds": elapsed, "loaded": loaded}))
+"""
+
+
+def measure(variant_dir, extra=()):
+    """One import in a fresh interpreter; returns (seconds, heavy modules loaded)."""
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, *extra], cwd=variant_dir,
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variant", default="Cloud", help="Directory holding whatsapp_service.py")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    variant_dir = os.path.join(ROOT, args.variant)
+    measure(variant_dir, HEAVY)  # Warm byte-code caches
+    for label, extra in (("lazy", ()), ("eager", HEAVY)):
+        times = []
+        for _ in range(args.runs):
+            seconds, loaded = measure(variant_dir, extra)
+            times.append(seconds * 1000)
+        print(f"{label:<6} median {statistics.median(times):7.1f} ms  "
+              f"min {min(times):7.1f} ms  loaded: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Benchmark WhatsAppService end to end against the fake WhatsApp Web.
+
+Starts fake_whatsapp.py in-process, points the service at it through
+WHATSAPP_WEB_URL and drives headless Chrome through the normal
+load_contacts() / start_sending() path. For a text-only and a media campaign
+it reports contacts per minute, per-phase p50/p95 latency, peak Chrome
+memory and how often the memory governor stepped in.
+
+    python run_benchmark.py --contacts 50 --navigation in_app --chat-ms 800
+    python run_benchmark.py --max-per-hour 900 --pipeline   # compare with and without
+    python run_benchmark.py --variant Local/Mac --scenario media --json out.json
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from fake_whatsapp import DEFAULTS, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 1x1 PNG used as the campaign attachment
+PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+class MemorySampler:
+    """Poll the Chrome process tree's memory in the background and keep the peak."""
+
+    def __init__(self, ws, service, interval=0.5):
+        self.ws = ws
+        self.service = service
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                rss = self.ws.process_tree_rss(self.service.driver.service.process.pid)
+            except Exception:
+                rss = None  # Between restarts
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+
+def write_contacts(ws, path, count):
+    """CSV of `count` distinct, well-formed numbers."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{ws.PHONE_COLUMN},\"{ws.NAME_COLUMN}\"\n")
+        for i in range(count):
+            f.write(f"+1555{i:07d},Contact {i}\n")
+
+
+def run_scenario(ws, name, args, workdir):
+    """Run one campaign and return its measurements."""
+    rate = ws.RateController(
+        max_per_hour=args.max_per_hour, start_per_hour=args.max_per_hour, jitter=0
+    )
+    service = ws.WhatsAppService(f"bench_{name}", rate_controller=rate, echo_logs=args.verbose)
+    service.session_dir = os.path.join(workdir, f"profile_{name}")
+    service.navigation = args.navigation
+    service.pipeline = args.pipeline
+
+    contacts = os.path.join(workdir, f"contacts_{name}.csv")
+    write_contacts(ws, contacts, args.contacts)
+    media_path = None
+    if name == "media":
+        media_path = os.path.join(workdir, "pixel.png")
+        with open(media_path, "wb") as f:
+            f.write(PIXEL_PNG)
+
+    try:
+        started = time.perf_counter()
+        service.setup_driver()
+        deadline = time.monotonic() + args.login_timeout
+        while not service.check_connection():
+            if time.monotonic() > deadline:
+                raise RuntimeError("fake app never reached the logged-in state")
+            time.sleep(0.2)
+        startup = time.perf_counter() - started
+
+        with open(contacts, "rb") as f:
+            if not service.load_contacts(f.read()):
+                raise RuntimeError("could not load contacts")
+
+        sampler = MemorySampler(ws, service)
+        sampler.start()
+        started = time.perf_counter()
+        if not service.start_sending(args.message, args.contacts, media_path):
+            raise RuntimeError("start_sending refused to start")
+        while service.is_running or service.queueing:
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        peak = sampler.stop()
+
+        status = service.get_status()
+        metrics = status["metrics"]
+        return {
+            "scenario": name,
+            "navigation": args.navigation,
+            "pipeline": args.pipeline,
+            "contacts": args.contacts,
+            "sent": metrics["sent"],
+            "failed": metrics["failed"],
+            "startup_seconds": round(startup, 2),
+            "seconds": round(elapsed, 2),
+            "contacts_per_minute": round(metrics["sent"] * 60 / elapsed, 2) if elapsed else None,
+            "phases": {p: {"p50": s["p50"], "p95": s["p95"]} for p, s in metrics["phases"].items()},
+            "per_contact": {"p50": metrics["per_contact"]["p50"], "p95": metrics["per_contact"]["p95"]},
+            "peak_chrome_mb": round(peak / 2 ** 20, 1) if peak else None,
+            "memory": status["memory"],
+            "delivery": status["delivery"],
+        }
+    finally:
+        service.close()
+
+
+def print_report(result):
+    mode = result["navigation"] + (", pipeline" if result["pipeline"] else "")
+    print(f"\n== {result['scenario']} ({mode}) ==")
+    print(f"sent {result['sent']}/{result['contacts']}, failed {result['failed']}, "
+          f"{result['seconds']}s -> {result['contacts_per_minute']} contacts/min "
+          f"(startup {result['startup_seconds']}s)")
+    print(f"per contact p50 {result['per_contact']['p50']}s  p95 {result['per_contact']['p95']}s")
+    for phase, s in result["phases"].items():
+        print(f"  {phase:<12} p50 {s['p50']}s  p95 {s['p95']}s")
+    peak = result["peak_chrome_mb"]
+    delivery = result["delivery"]
+    print(f"delivery at finish: final {delivery['final']}, still tracking {delivery['tracking']}")
+    memory = result["memory"]
+    print(f"peak Chrome RSS: {f'{peak} MB' if peak else 'n/a'} "
+          f"(trims {memory['trims']}, restarts {memory['restarts']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variant", default="Cloud", help="Directory holding whatsapp_service.py")
+    parser.add_argument("--scenario", choices=("text", "media", "all"), default="all")
+    parser.add_argument("--contacts", type=int, default=30)
+    parser.add_argument("--message", default="Hi {Contact's Public Display Name|there}, this is a benchmark message.")
+    parser.add_argument("--navigation", choices=("reload", "in_app"), default="reload")
+    parser.add_argument("--pipeline", action="store_true", help="Open the next chat during the pacing delay")
+    parser.add_argument("--max-per-hour", type=int, default=360000, help="Pacing ceiling (high = measure raw send speed)")
+    parser.add_argument("--login-timeout", type=float, default=60)
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Echo service logs")
+    for key, value in DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    server, base_url = start_server(**{key: getattr(args, key) for key in DEFAULTS})
+    # Must be set before the service module reads them at import time
+    os.environ["WHATSAPP_WEB_URL"] = base_url
+    os.environ["WHATSAPP_HEADLESS"] = "1"
+    os.environ.setdefault("WHATSAPP_QUIET", "1")
+    sys.path.insert(0, os.path.join(ROOT, args.variant))
+    import whatsapp_service as ws
+
+    workdir = tempfile.mkdtemp(prefix="wa-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # Keep uploads, journals and the media cache out of the repo
+    results = []
+    try:
+        scenarios = ("text", "media") if args.scenario == "all" else (args.scenario,)
+        for name in scenarios:
+            result = run_scenario(ws, name, args, workdir)
+            print_report(result)
+            results.append(result)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
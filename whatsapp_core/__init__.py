@@ -0,0 +1,50 @@
+"""Shared core of the WhatsApp automation service.
+
+The platform entry points (Cloud/, Local/Mac/, Local/Windows/) re-export
+everything here and only choose a PlatformProfile. Importing the core is
+cheap: pandas and openpyxl load when contacts are first read, selenium when
+the first browser starts.
+"""
+from .browser import (
+    WHATSAPP_WEB_URL, QR_CANVAS_XPATH, COMPOSER_XPATH, SEARCH_BOX_XPATH, SCRIPT_TIMEOUT,
+    PlatformProfile, use_profile, current_profile, get_chromedriver_path,
+    build_chrome_options, install_page_probe, is_session_lost, trim_profile_caches,
+    launch_driver, DriverPool, benchmark_startup, process_tree_rss,
+)
+from .delivery import DeliveryTracker
+from .contacts import (
+    PHONE_COLUMN, NAME_COLUMN, E164_PATTERN, Contact, normalize_phones,
+    MessageTemplate, ContactSource,
+)
+from .jobs import JobQueue, default_job_queue
+from .journal import campaign_key, SendJournal
+from .logs import LogBuffer
+from .media import MEDIA_ACCEPT, MediaStage
+from .metrics import LatencyHistogram, SendMetrics, render_prometheus
+from .pacing import RateController, MemoryGovernor
+from .progress import Progress
+from .registry import NumberRegistry, default_number_registry
+from .service import WhatsAppService, benchmark_navigation
+from .orchestrator import CampaignOrchestrator
+from .worker import StatusChannel, SessionProcess, open_session
+
+__all__ = [
+    "WHATSAPP_WEB_URL", "QR_CANVAS_XPATH", "COMPOSER_XPATH", "SEARCH_BOX_XPATH", "SCRIPT_TIMEOUT",
+    "PlatformProfile", "use_profile", "current_profile", "get_chromedriver_path",
+    "build_chrome_options", "install_page_probe", "is_session_lost", "trim_profile_caches",
+    "launch_driver", "DriverPool", "benchmark_startup", "process_tree_rss",
+    "PHONE_COLUMN", "NAME_COLUMN", "E164_PATTERN", "Contact", "normalize_phones",
+    "MessageTemplate", "ContactSource",
+    "DeliveryTracker",
+    "JobQueue", "default_job_queue",
+    "campaign_key", "SendJournal",
+    "LogBuffer",
+    "MEDIA_ACCEPT", "MediaStage",
+    "LatencyHistogram", "SendMetrics", "render_prometheus",
+    "RateController", "MemoryGovernor",
+    "Progress",
+    "NumberRegistry", "default_number_registry",
+    "WhatsAppService", "benchmark_navigation",
+    "CampaignOrchestrator",
+    "StatusChannel", "SessionProcess", "open_session",
+]
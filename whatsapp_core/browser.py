@@ -0,0 +1,515 @@
+"""Chrome lifecycle for WhatsApp Web: options, launch, page probe and warm pool."""
+import collections
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+from .lazy import LazyImport
+from .logs import default_log
+
+webdriver = LazyImport("selenium.webdriver")
+By = LazyImport("selenium.webdriver.common.by", "By")
+Service = LazyImport("selenium.webdriver.chrome.service", "Service")
+
+WHATSAPP_WEB_URL = os.environ.get("WHATSAPP_WEB_URL", "https://web.whatsapp.com")  # Overridable for offline benchmarks
+QR_CANVAS_XPATH = '//canvas[@aria-label="Scan this QR code to link a device!"]'
+COMPOSER_XPATH = '//div[@contenteditable="true"][@data-tab="10"]'
+SEARCH_BOX_XPATH = '//div[@contenteditable="true"][@data-tab="3"]'
+# Disk caches Chrome rebuilds on its own; the login lives elsewhere in the profile
+PROFILE_CACHE_DIRS = (
+    os.path.join("Default", "Cache"),
+    os.path.join("Default", "Code Cache"),
+    os.path.join("Default", "GPUCache"),
+    "GrShaderCache",
+    "GraphiteDawnCache",
+    "ShaderCache",
+)
+
+# Readiness probe, registered once per browser so it runs on every page load.
+# A MutationObserver re-evaluates the pending checks whenever the DOM changes,
+# so waits resolve the moment the UI is ready instead of after fixed sleeps.
+PROBE_JS = r"""
+(function () {
+  if (window.__waProbe) { return; }
+  function xpath(expr) {
+    return document.evaluate(expr, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  }
+  var outgoing = 0;
+  var target = '';
+  var chatMark = null;
+  function header() {
+    var h = document.querySelector('#main header');
+    return h ? h.innerText : null;
+  }
+  var checks = {
+    chat_open: function () { return !!xpath('//div[@contenteditable="true"][@data-tab="10"]'); },
+    chat_switched: function () { return checks.chat_open() && header() !== chatMark; },
+    search_box: function () { return !!xpath('//div[@contenteditable="true"][@data-tab="3"]'); },
+    search_result: function () {
+      return !!target && !!xpath('//span[@title][contains(translate(@title, " +-()", ""), "' + target + '")]');
+    },
+    search_empty: function () { return !!xpath('//*[contains(text(), "No results found")]'); },
+    invalid_number: function () { return !!xpath('//div[contains(text(), "Phone number shared via url is invalid")]'); },
+    media_ready: function () { return !!document.querySelector('span[data-icon="send"]'); },
+    rate_limited: function () {
+      return RATE_LIMIT_TEXTS.some(function (t) { return !!xpath('//*[contains(text(), "' + t + '")]'); });
+    },
+    outbox_clear: function () {
+      var main = document.getElementById('main');
+      return !!main && main.querySelectorAll('.message-out').length > outgoing
+        && !main.querySelector('span[data-icon="msg-time"]');
+    }
+  };
+  var waiters = [];
+  var scheduled = false;
+  function run() {
+    scheduled = false;
+    waiters = waiters.filter(function (w) {
+      for (var i = 0; i < w.names.length; i++) {
+        if (checks[w.names[i]]()) { w.finish(w.names[i]); return false; }
+      }
+      return true;
+    });
+  }
+  new MutationObserver(function () {
+    if (waiters.length && !scheduled) { scheduled = true; setTimeout(run, 0); }
+  }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+  window.__waProbe = {
+    wait: function (names, timeoutMs, done) {
+      var w = {names: names};
+      var timer = setTimeout(function () {
+        var i = waiters.indexOf(w);
+        if (i !== -1) { waiters.splice(i, 1); }
+        w.finish(null);
+      }, timeoutMs);
+      w.finish = function (name) { clearTimeout(timer); done(name); };
+      waiters.push(w);
+      run();
+    },
+    check: function (name) { return checks[name](); },
+    markChat: function (digits) {
+      target = digits;
+      chatMark = header();
+    },
+    markOutgoing: function () {
+      var main = document.getElementById('main');
+      outgoing = main ? main.querySelectorAll('.message-out').length : 0;
+    }
+  };
+})();
+"""
+
+# Starts the in-app new-chat flow: remembers the open chat, clicks "New chat"
+OPEN_NEW_CHAT_JS = r"""
+if (!window.__waProbe || !document.getElementById('pane-side')) { return false; }
+window.__waProbe.markChat(arguments[0]);
+var button = document.evaluate(
+  '//div[@title="New chat" or @aria-label="New chat"] | //span[@data-icon="new-chat-outline" or @data-icon="chat"]',
+  document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!button) { return false; }
+button.click();
+return true;
+"""
+
+# Composer text as the user sees it: emoji images count as their alt text
+COMPOSER_TEXT_JS = r"""
+function text(node) {
+  if (node.nodeType === 3) { return node.data; }
+  if (node.nodeName === 'IMG') { return node.alt || ''; }
+  // A block's trailing <br> only keeps an empty line open; the block itself ends the line
+  if (node.nodeName === 'BR') { return node.nextSibling ? '\n' : ''; }
+  var out = '';
+  for (var i = 0; i < node.childNodes.length; i++) { out += text(node.childNodes[i]); }
+  return node.nodeName === 'P' || node.nodeName === 'DIV' ? out + '\n' : out;
+}
+return text(arguments[0]);
+"""
+
+# Inserts the whole message in one synthetic paste, keeping line breaks
+PASTE_JS = r"""
+var el = arguments[0];
+el.focus();
+var data = new DataTransfer();
+data.setData('text/plain', arguments[1]);
+el.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+""" + COMPOSER_TEXT_JS
+
+CLEAR_COMPOSER_JS = r"""
+arguments[0].focus();
+document.execCommand('selectAll', false, null);
+document.execCommand('delete', false, null);
+"""
+
+# Whole-page state in one round trip: logged in, QR, loading, phone offline, chat open
+STATE_JS = r"""
+return (function () {
+  function found(expr) {
+    return !!document.evaluate(expr, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  }
+  var loggedIn = [
+    '//div[@id="pane-side"]',                          // Chat list
+    '//header//img',                                   // Profile picture
+    '//div[@contenteditable="true"][@data-tab="3"]',   // Search box
+    '//span[@data-icon="chat"]',                       // New chat icon
+    '//div[@id="side"]'                                // Side panel
+  ].some(found);
+  var page = {
+    logged_in: loggedIn,
+    qr: found('//canvas[@aria-label="Scan this QR code to link a device!"]'),
+    chat_open: loggedIn && found('//div[@contenteditable="true"][@data-tab="10"]'),
+    phone_offline: loggedIn && (found('//*[contains(text(), "Phone not connected")]')
+      || found('//*[contains(text(), "Computer not connected")]'))
+  };
+  page.state = page.phone_offline ? 'phone_offline'
+    : page.chat_open ? 'chat_open'
+    : loggedIn ? 'logged_in'
+    : page.qr ? 'qr'
+    : 'loading';
+  return page;
+})();
+"""
+
+# Cheap identity for the QR currently on screen: the payload WhatsApp keeps in
+# data-ref when present, otherwise a hash of a sparse sample of canvas pixels
+QR_FINGERPRINT_JS = r"""
+var canvas = document.evaluate('//canvas[@aria-label="Scan this QR code to link a device!"]',
+  document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!canvas) { return null; }
+var holder = canvas.closest('[data-ref]');
+if (holder) { return holder.getAttribute('data-ref'); }
+var ctx = canvas.getContext('2d');
+var data = ctx ? ctx.getImageData(0, 0, canvas.width, canvas.height).data : canvas.toDataURL();
+var hash = 2166136261;
+for (var i = 0; i < data.length; i += 16) {
+  hash ^= typeof data === 'string' ? data.charCodeAt(i) : data[i];
+  hash = Math.imul(hash, 16777619) >>> 0;
+}
+return canvas.width + 'x' + canvas.height + ':' + hash;
+"""
+
+# Status icon of the last message in every chat-list row, keyed by the row's
+# number (digits of its title) and by the title itself for saved contacts
+CHAT_STATUSES_JS = r"""
+var out = {};
+var rows = document.querySelectorAll('#pane-side [role="listitem"], #pane-side [role="row"]');
+for (var i = 0; i < rows.length; i++) {
+  var title = rows[i].querySelector('span[title]');
+  var icon = rows[i].querySelector('span[data-icon^="status-"], span[data-icon^="msg-"]');
+  if (!title || !icon) { continue; }
+  var text = title.getAttribute('title');
+  var digits = text.replace(/\D/g, '');
+  out[text] = icon.getAttribute('data-icon');
+  if (digits) { out[digits] = icon.getAttribute('data-icon'); }
+}
+return out;
+"""
+
+# Banner texts WhatsApp shows when an account is sending too fast
+RATE_LIMIT_TEXTS = [
+    "sending too many messages",
+    "You can't send messages right now",
+    "Try again later",
+]
+PROBE_JS = PROBE_JS.replace("RATE_LIMIT_TEXTS", json.dumps(RATE_LIMIT_TEXTS))
+
+# Error texts meaning the browser, its tab or chromedriver is gone for good
+SESSION_LOST_TEXTS = (
+    "invalid session id",
+    "session deleted",
+    "chrome not reachable",
+    "disconnected: not connected to devtools",
+    "target window already closed",
+    "no such window",
+    "tab crashed",
+    "target crashed",
+    "max retries exceeded",
+    "connection refused",
+    "connection aborted",
+    "remote end closed connection",
+)
+
+# Installs the probe if this page was loaded before it was registered, then waits
+WAIT_JS = PROBE_JS + "window.__waProbe.wait(arguments[0], arguments[1], arguments[arguments.length - 1]);"
+SCRIPT_TIMEOUT = 30
+
+PlatformProfile = collections.namedtuple(
+    "PlatformProfile", ["name", "headless", "chrome_binary", "chrome_args"],
+    defaults=[False, None, ()]
+)
+_profile = PlatformProfile("default")
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def use_profile(profile):
+    """Set the PlatformProfile every browser launched from now on is built with."""
+    global _profile
+    _profile = profile
+
+
+def current_profile():
+    return _profile
+
+
+def get_chromedriver_path():
+    """Resolve the chromedriver binary once per process."""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            # CHROMEDRIVER_PATH skips the network lookup (and webdriver_manager) entirely
+            _chromedriver_path = os.environ.get("CHROMEDRIVER_PATH")
+            if not _chromedriver_path:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _chromedriver_path = ChromeDriverManager().install()
+        return _chromedriver_path
+
+
+def build_chrome_options(session_dir):
+    """Chrome options for a WhatsApp Web profile stored in session_dir."""
+    options = webdriver.ChromeOptions()
+    options.add_argument(f"--user-data-dir={session_dir}")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-software-rasterizer")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-notifications")
+    options.add_argument("--blink-settings=imagesEnabled=false") # Disable images to save memory
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    
+    # Platform specifics come from the entry point's profile
+    if _profile.chrome_binary:
+        options.binary_location = _profile.chrome_binary
+    if _profile.headless:
+        options.add_argument("--headless=new")
+    for arg in _profile.chrome_args:
+        options.add_argument(arg)
+    return options
+
+
+def install_page_probe(driver, log=default_log):
+    """Register the readiness probe to run on every page the driver loads."""
+    driver.set_script_timeout(SCRIPT_TIMEOUT)
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": PROBE_JS})
+    except Exception as e:
+        # Waits still inject the probe themselves, just a little later
+        log(f"Warning: Could not register page probe: {e}", level="warning")
+
+
+def is_session_lost(error):
+    """Whether a WebDriver error means the browser session is dead, not just a page hiccup."""
+    from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException, ConnectionError)):
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in SESSION_LOST_TEXTS)
+
+
+def trim_profile_caches(session_dir):
+    """Delete the profile's disk caches (only while its browser is closed)."""
+    for name in PROFILE_CACHE_DIRS:
+        shutil.rmtree(os.path.join(session_dir, name), ignore_errors=True)
+
+
+def launch_driver(session_dir, log=default_log):
+    """Start Chrome on session_dir and open WhatsApp Web; `log` receives its warnings."""
+    os.makedirs(session_dir, exist_ok=True)
+    driver = webdriver.Chrome(
+        service=Service(get_chromedriver_path()),
+        options=build_chrome_options(session_dir)
+    )
+    install_page_probe(driver, log)
+    driver.get(WHATSAPP_WEB_URL)
+    return driver
+
+
+class DriverPool:
+    """Keep pre-launched Chrome instances on WhatsApp Web ready for new sessions.
+    
+    Each warm browser gets its own fresh profile under base_dir. Once handed to
+    a session that profile belongs to that session, so a browser only returns
+    to the pool if it is still showing the QR code (never logged in).
+    """
+    
+    def __init__(self, size=2, base_dir="./whatsapp_sessions", log=default_log):
+        self.size = size
+        self.base_dir = base_dir
+        self.log = log
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._launching = 0
+        self._closed = False
+    
+    def start(self):
+        """Resolve chromedriver and begin warming browsers in the background."""
+        get_chromedriver_path()
+        self._refill()
+    
+    def _refill(self):
+        """Launch enough browsers to bring the pool back to its target size."""
+        with self._lock:
+            if self._closed:
+                return
+            needed = self.size - self._ready.qsize() - self._launching
+            self._launching += max(needed, 0)
+        for _ in range(needed):
+            thread = threading.Thread(target=self._launch_one)
+            thread.daemon = True
+            thread.start()
+    
+    def _launch_one(self):
+        """Launch one warm browser into the pool."""
+        session_dir = os.path.join(self.base_dir, f"pool_{uuid.uuid4().hex[:12]}")
+        try:
+            driver = launch_driver(session_dir, self.log)
+            if self._closed:
+                driver.quit()
+                shutil.rmtree(session_dir, ignore_errors=True)
+            else:
+                self._ready.put((driver, session_dir))
+        except Exception as e:
+            self.log(f"Driver pool failed to launch browser: {e}", level="error")
+            shutil.rmtree(session_dir, ignore_errors=True)
+        finally:
+            with self._lock:
+                self._launching -= 1
+    
+    def acquire(self):
+        """Take a warm (driver, session_dir) pair, or None if none is ready.
+        
+        A browser left idle in the pool for long shows "click to reload"
+        instead of its QR code, so one without a QR canvas is reloaded first;
+        one that no longer responds is dropped for the next.
+        """
+        pooled = None
+        while pooled is None:
+            try:
+                driver, session_dir = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not driver.find_elements(By.XPATH, QR_CANVAS_XPATH):
+                    driver.get(WHATSAPP_WEB_URL)
+                pooled = (driver, session_dir)
+            except Exception as e:
+                self.log(f"Driver pool dropped an unresponsive browser: {e}", level="warning")
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                shutil.rmtree(session_dir, ignore_errors=True)
+        self._refill()
+        return pooled
+    
+    def release(self, driver, session_dir, reusable=False):
+        """Return a browser; returns True if it went back into the pool."""
+        if reusable and not self._closed:
+            try:
+                # Only recycle when the QR is showing, i.e. no account is linked
+                if driver.find_elements(By.XPATH, QR_CANVAS_XPATH):
+                    driver.get(WHATSAPP_WEB_URL)
+                    self._ready.put((driver, session_dir))
+                    return True
+            except Exception:
+                pass
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._refill()
+        return False
+    
+    def close(self):
+        """Quit every warm browser and delete their unused profiles."""
+        self._closed = True
+        while True:
+            try:
+                driver, session_dir = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+
+def benchmark_startup(pool, runs=3):
+    """Time a cold driver launch against taking one from a warm pool.
+    
+    Returns a dict of per-run seconds for both paths. The pool should already
+    be started; each pooled run waits for a warm browser before timing.
+    """
+    results = {"cold": [], "pooled": []}
+    for i in range(runs):
+        session_dir = os.path.join(pool.base_dir, f"bench_{uuid.uuid4().hex[:12]}")
+        started = time.perf_counter()
+        driver = launch_driver(session_dir)
+        results["cold"].append(time.perf_counter() - started)
+        driver.quit()
+        shutil.rmtree(session_dir, ignore_errors=True)
+        
+        while pool._ready.empty():
+            time.sleep(0.1)
+        started = time.perf_counter()
+        driver, session_dir = pool.acquire()
+        results["pooled"].append(time.perf_counter() - started)
+        pool.release(driver, session_dir, reusable=True)
+    return results
+
+
+def process_tree_rss(pid):
+    """Resident bytes of a process and all of its descendants, or None if unreadable.
+    
+    Uses psutil when it is installed and falls back to /proc on Linux.
+    """
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    
+    if psutil:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass  # Exited while we were counting
+        return total
+    
+    if not os.path.isdir("/proc"):
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children = collections.defaultdict(list)
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/statm") as f:
+                rss[int(entry)] = int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+        children[ppid].append(int(entry))
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
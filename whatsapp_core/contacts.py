@@ -0,0 +1,287 @@
+"""Streaming contact reader, phone normalization and message templates."""
+import collections
+import csv
+import itertools
+import os
+import re
+import shutil
+import uuid
+
+from .lazy import LazyImport
+
+pd = LazyImport("pandas")
+load_workbook = LazyImport("openpyxl", "load_workbook")
+
+PHONE_COLUMN = "Phone Number"
+NAME_COLUMN = "Contact's Public Display Name"
+UPLOAD_DIR = "./whatsapp_sessions/uploads"  # Where uploads are spooled before they are read
+E164_PATTERN = r"^\+[1-9]\d{7,14}$"
+
+
+Contact = collections.namedtuple("Contact", ["phone", "name", "message"], defaults=[None])
+
+
+def _cell_text(value):
+    """Turn a spreadsheet cell into text without float artefacts like '.0'."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def spool_upload(file_content, directory):
+    """Write uploaded bytes or a file object to a new file in `directory`; returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"contacts_{uuid.uuid4().hex[:12]}")
+    with open(path, "wb") as f:
+        if isinstance(file_content, (bytes, bytearray)):
+            f.write(file_content)
+        else:
+            shutil.copyfileobj(file_content, f, 1024 * 1024)
+    return path
+
+
+def normalize_phones(phones, default_country_code=""):
+    """Normalize a Series of phone strings to E.164 in one vectorized pass.
+    
+    Numbers starting with + or 00 are taken as international. With a default
+    country code every other number is taken as national: a leading trunk 0
+    is replaced by the country code and anything else is prefixed with it,
+    whatever its length. Without one, the digits must already include the
+    country code. Anything that is not valid E.164 afterwards becomes NaN.
+    """
+    text = phones.fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    international = text.str.startswith("+") | text.str.startswith("00")
+    digits = text.str.replace(r"\D", "", regex=True)
+    digits = digits.where(~text.str.startswith("00"), digits.str[2:])
+    
+    country = "".join(filter(str.isdigit, str(default_country_code)))
+    if country:
+        trunk = ~international & digits.str.startswith("0")
+        national = ~international & ~trunk
+        digits = digits.where(~trunk, country + digits.str[1:])
+        digits = digits.where(~national, country + digits)
+    
+    e164 = "+" + digits
+    return e164.where(e164.str.match(E164_PATTERN))
+
+
+class MessageTemplate:
+    """Message text with per-contact placeholders, compiled once per campaign.
+    
+    {Column} is replaced by the contact's value in that spreadsheet column.
+    {Column|Other Column} falls back to the next column when the value is
+    empty, and a last alternative that is not a column is literal default
+    text, e.g. "Hi {First Name|Contact's Public Display Name|there}".
+    Write {{ and }} for literal braces.
+    """
+    
+    TOKEN = re.compile(r"\{\{|\}\}|\{([^{}]+)\}")
+    
+    def __init__(self, text):
+        self.text = text or ""
+        self.parts = []  # Literal strings and tuples of alternatives
+        pos = 0
+        for match in self.TOKEN.finditer(self.text):
+            self.parts.append(self.text[pos:match.start()])
+            if match.group(1) is None:
+                self.parts.append(match.group(0)[0])
+            else:
+                self.parts.append(tuple(alt.strip() for alt in match.group(1).split("|")))
+            pos = match.end()
+        self.parts.append(self.text[pos:])
+        self.placeholders = [p for p in self.parts if isinstance(p, tuple)]
+        self._bound = None
+    
+    def bind(self, header):
+        """Resolve placeholders against the sheet's columns.
+        
+        Raises ValueError naming every placeholder that matches no column and
+        has no default, so typos surface before any message goes out.
+        """
+        bound, missing = [], []
+        for alternatives in self.placeholders:
+            columns = [a for a in alternatives if a in header]
+            default = alternatives[-1] if len(alternatives) > 1 and alternatives[-1] not in header else ""
+            if not columns and not default:
+                missing.append("{" + "|".join(alternatives) + "}")
+            bound.append((columns, default))
+        if missing:
+            raise ValueError(f"Template uses unknown columns: {', '.join(missing)}")
+        self._bound = bound
+        return self
+    
+    @property
+    def columns(self):
+        """Columns the bound template reads."""
+        return list(dict.fromkeys(c for columns, _ in self._bound or [] for c in columns))
+    
+    def render(self, df):
+        """Render the message for every row of a string DataFrame at once."""
+        if not self.placeholders:
+            return [self.text.replace("{{", "{").replace("}}", "}")] * len(df)
+        out = pd.Series("", index=df.index, dtype=object)
+        bound = iter(self._bound)
+        for part in self.parts:
+            if isinstance(part, str):
+                out = out + part
+                continue
+            columns, default = next(bound)
+            value = pd.Series(default, index=df.index, dtype=object)
+            for column in reversed(columns):
+                value = df[column].where(df[column] != "", value)
+            out = out + value
+        return out.tolist()
+
+
+class ContactSource:
+    """Lazily read contacts from an uploaded XLSX or CSV file.
+    
+    Only the phone and name columns are kept, and rows are read one at a time
+    from disk on every iteration, so memory stays flat regardless of file size.
+    Legacy .xls files have no streaming reader and fall back to pandas.
+    
+    iter_valid() is the pre-send stage: phones are normalized to E.164 chunk by
+    chunk, and invalid or repeated numbers are dropped before they reach the
+    browser. validate() runs it once to report the counts up front.
+    """
+    
+    def __init__(self, path, columns=(PHONE_COLUMN, NAME_COLUMN), default_country_code=""):
+        self.path = path
+        self.columns = list(columns)
+        self.default_country_code = default_country_code
+        self.stats = None
+        self.format = self._detect_format(path)
+        self.header = [_cell_text(v) for v in next(self._rows(), [])]
+        if self.columns[0] not in self.header:
+            raise ValueError(f"Missing column: {self.columns[0]}")
+        self.count = self._count_rows()
+    
+    @classmethod
+    def from_upload(cls, file_content, directory, **kwargs):
+        """Spool uploaded bytes or a file object to disk and open it."""
+        return cls(spool_upload(file_content, directory), **kwargs)
+    
+    @staticmethod
+    def _detect_format(path):
+        """Sniff the file type from its magic bytes."""
+        with open(path, "rb") as f:
+            magic = f.read(4)
+        if magic == b"PK\x03\x04":
+            return "xlsx"
+        if magic == b"\xd0\xcf\x11\xe0":
+            return "xls"
+        return "csv"
+    
+    def _rows(self):
+        """Yield raw row tuples, header first."""
+        if self.format == "xlsx":
+            # Pass a file object: openpyxl rejects paths without an .xlsx extension
+            with open(self.path, "rb") as f:
+                workbook = load_workbook(f, read_only=True, data_only=True)
+                try:
+                    yield from workbook.active.iter_rows(values_only=True)
+                finally:
+                    workbook.close()
+        elif self.format == "csv":
+            with open(self.path, newline="", encoding="utf-8-sig", errors="replace") as f:
+                yield from csv.reader(f)
+        else:
+            df = pd.read_excel(self.path, dtype=str, header=None)
+            for row in df.itertuples(index=False):
+                yield tuple(None if pd.isna(v) else v for v in row)
+    
+    def _count_rows(self):
+        """Count data rows, using the sheet dimensions when the file has them."""
+        if self.format == "xlsx":
+            with open(self.path, "rb") as f:
+                workbook = load_workbook(f, read_only=True)
+                try:
+                    max_row = workbook.active.max_row
+                finally:
+                    workbook.close()
+            if max_row:
+                return max(max_row - 1, 0)
+        return sum(1 for _ in self._rows()) - 1
+    
+    def iter_rows(self, columns=None):
+        """Yield the projected column values of each data row as text."""
+        indexes = [
+            self.header.index(c) if c in self.header else None
+            for c in (columns or self.columns)
+        ]
+        rows = self._rows()
+        next(rows, None)  # Header
+        for row in rows:
+            yield tuple(
+                _cell_text(row[i]) if i is not None and i < len(row) else ""
+                for i in indexes
+            )
+    
+    def iter_chunks(self, chunk_size=5000, columns=None):
+        """Yield the projected rows as string DataFrames of up to chunk_size rows."""
+        columns = columns or self.columns
+        rows = self.iter_rows(columns)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield pd.DataFrame(chunk, columns=columns, dtype=str)
+    
+    def iter_valid(self, stats=None, template=None):
+        """Yield contacts with normalized, valid, first-seen phone numbers.
+        
+        If a stats dict is given, blank/invalid/duplicate/valid counts are
+        accumulated into it as rows are read. With a bound MessageTemplate,
+        each chunk's messages are rendered in one pass and carried on the
+        contacts.
+        """
+        stats = stats if stats is not None else {}
+        for key in ("blank", "invalid", "duplicates", "valid"):
+            stats.setdefault(key, 0)
+        seen = set()  # Numbers as ints to keep the index compact
+        phone_col, name_col = self.columns[0], self.columns[1]
+        columns = self.columns
+        if template is not None:
+            columns = list(dict.fromkeys(self.columns + template.columns))
+        
+        for chunk in self.iter_chunks(columns=columns):
+            blank = chunk[phone_col] == ""
+            phones = normalize_phones(chunk[phone_col], self.default_country_code)
+            stats["blank"] += int(blank.sum())
+            stats["invalid"] += int((phones.isna() & ~blank).sum())
+            
+            chunk = chunk.assign(**{phone_col: phones}).dropna(subset=[phone_col])
+            numbers = chunk[phone_col].str[1:].astype("int64")
+            duplicate = numbers.duplicated() | numbers.isin(seen)
+            stats["duplicates"] += int(duplicate.sum())
+            chunk = chunk[~duplicate]
+            seen.update(numbers[~duplicate].tolist())
+            stats["valid"] += len(chunk)
+            
+            names = chunk[name_col].replace("", "Unknown")
+            messages = template.render(chunk) if template is not None else itertools.repeat(None)
+            yield from map(Contact, chunk[phone_col].tolist(), names.tolist(), messages)
+    
+    def validate(self):
+        """Run the normalization pass over the whole file and return its counts."""
+        stats = {}
+        for _ in self.iter_valid(stats):
+            pass
+        self.stats = stats
+        return stats
+    
+    def __iter__(self):
+        for phone, name, *_ in self.iter_rows():
+            yield Contact(phone, name or "Unknown")
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        """Delete the spooled upload."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,118 @@
+"""Background delivery confirmation for sent messages."""
+import threading
+import time
+
+# Chat-list icon suffix -> delivery state (status-* in the chat list, msg-* in a chat)
+ICON_STATES = (("-dblcheck", "delivered"), ("-check", "sent"), ("-time", "pending"))
+
+
+def icon_state(icon):
+    """Delivery state for a status icon name, or None if it is not one."""
+    for suffix, state in ICON_STATES:
+        if icon and icon.endswith(suffix):
+            return state
+    return None
+
+
+class DeliveryTracker:
+    """Follow sent messages until WhatsApp shows them delivered, off the send path.
+
+    track() records a message right after its send click and returns at
+    once. A background thread calls read_statuses() every `interval` seconds
+    (one script call returning the status icon of every chat in the chat
+    list) and moves each message through pending -> sent -> delivered.
+    Messages not delivered within `timeout` seconds, e.g. because the
+    recipient's phone is offline or the chat scrolled out of the list, are
+    finalized with the last state seen. Every final outcome is passed to
+    on_final(entry).
+    """
+
+    def __init__(self, read_statuses, on_final, interval=5.0, timeout=300.0, stuck_after=30.0):
+        self.read_statuses = read_statuses  # () -> {digits or chat title: icon name}, or None
+        self.on_final = on_final
+        self.interval = interval
+        self.timeout = timeout
+        self.stuck_after = stuck_after  # Seconds on the clock before a message counts as stuck
+        self.final = {"delivered": 0, "sent": 0, "pending": 0}
+        self._tracked = []
+        self._new_stuck = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def track(self, phone, name, campaign):
+        """Start following the message just sent to phone."""
+        entry = {
+            "phone": phone, "name": name, "campaign": campaign,
+            "digits": "".join(filter(str.isdigit, str(phone))),
+            "state": "pending", "since": time.time(), "stuck": False,
+        }
+        with self._lock:
+            self._tracked.append(entry)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def take_stuck(self):
+        """Messages that became stuck since the last call."""
+        with self._lock:
+            stuck, self._new_stuck = self._new_stuck, 0
+            return stuck
+
+    def counts(self):
+        """Tracked messages by current state, plus finalized outcomes."""
+        with self._lock:
+            live = {"pending": 0, "sent": 0, "delivered": 0}
+            for entry in self._tracked:
+                live[entry["state"]] += 1
+            return {"tracking": live, "final": dict(self.final)}
+
+    def close(self, statuses=None):
+        """Stop polling and finalize every tracked message with the state last seen.
+
+        `statuses` is one last {chat: icon} reading to apply first, if the
+        caller has one. Returns once the polling thread has exited.
+        """
+        self._stopping.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.update(statuses or {}, finalize=True)
+
+    def _run(self):
+        """Poll chat statuses while anything is tracked."""
+        while True:
+            stopping = self._stopping.wait(self.interval)
+            with self._lock:
+                if stopping or not self._tracked:
+                    self._thread = None
+                    return
+            try:
+                statuses = self.read_statuses()
+            except Exception:
+                statuses = None
+            self.update(statuses or {})
+
+    def update(self, statuses, finalize=False):
+        """Apply one batch of {chat: icon} readings and finalize what is done (everything if finalize)."""
+        now = time.time()
+        done, kept = [], []
+        with self._lock:
+            for entry in self._tracked:
+                state = icon_state(statuses.get(entry["digits"]) or statuses.get(entry["name"]))
+                if state:
+                    entry["state"] = state
+                if entry["state"] == "pending" and not entry["stuck"] and now - entry["since"] > self.stuck_after:
+                    entry["stuck"] = True
+                    self._new_stuck += 1
+                if finalize or entry["state"] == "delivered" or now - entry["since"] > self.timeout:
+                    done.append(entry)
+                    self.final[entry["state"]] += 1
+                else:
+                    kept.append(entry)
+            self._tracked = kept
+        for entry in done:
+            self.on_final(entry)
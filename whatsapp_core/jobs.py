@@ -0,0 +1,239 @@
+"""Persistent, prioritized queue of campaign sends."""
+import contextlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    media_path TEXT,
+    resume INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL,
+    created REAL NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+    session_id TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    name TEXT,
+    message TEXT,
+    priority INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    claimed_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (session_id, status, priority DESC, not_before, id);
+CREATE INDEX IF NOT EXISTS jobs_campaign ON jobs (campaign_id, status);
+"""
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def default_job_queue():
+    """The process-wide JobQueue at JOB_QUEUE_PATH, opened on first use."""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(os.environ.get("JOB_QUEUE_PATH", "./whatsapp_sessions/jobs.db"))
+        return _default_queue
+
+
+class JobQueue:
+    """Campaign sends stored in SQLite, one row per contact.
+
+    Every job belongs to one session and carries its campaign's priority and
+    not-before time. Session workers claim ready jobs in small batches inside
+    a single write transaction, so two workers (or two processes) never take
+    the same contact. Jobs still queued, or claimed by a worker that died,
+    are picked up again after a restart.
+
+    Job states: queued -> claimed -> sent / failed / skipped, or cancelled.
+    While a campaign is still being enqueued its jobs are "staged".
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @contextlib.contextmanager
+    def _write(self):
+        """One IMMEDIATE transaction, so concurrent claimers serialize on the write lock."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self._changed.notify_all()
+
+    def enqueue(self, session_id, contacts, message, media_path=None, priority=0,
+                not_before=None, resume=False, cancelled=None):
+        """Queue a campaign; `contacts` yields (phone, name, rendered message).
+
+        `not_before` is a Unix timestamp; None means send as soon as possible.
+        Returns (campaign id, number of contacts queued).
+
+        Contacts are read in chunks of 1000 outside the lock and written one
+        short transaction per chunk as "staged", so reading and rendering a
+        large list never holds up other sessions' claims or stats(). A last
+        transaction makes the whole campaign claimable at once, unless the
+        `cancelled` callable returns True by then: the campaign's jobs are
+        then cancelled instead and 0 is returned as the number queued.
+        """
+        now = time.time()
+        not_before = now if not_before is None else float(not_before)
+        with self._write() as db:
+            campaign_id = db.execute(
+                "INSERT INTO campaigns (session_id, message, media_path, resume, priority, not_before, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, message, media_path, int(resume), priority, not_before, now)
+            ).lastrowid
+        total = 0
+        contacts = iter(contacts)
+        try:
+            while True:
+                chunk = [
+                    (campaign_id, session_id, phone, name, text, priority, not_before)
+                    for phone, name, text in itertools.islice(contacts, 1000)
+                ]
+                if not chunk:
+                    break
+                with self._write() as db:
+                    db.executemany(
+                        "INSERT INTO jobs (campaign_id, session_id, phone, name, message, priority, not_before, status) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, 'staged')",
+                        chunk
+                    )
+                total += len(chunk)
+                if cancelled is not None and cancelled():
+                    break
+            with self._write() as db:
+                if cancelled is not None and cancelled():
+                    db.execute(
+                        "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE campaign_id = ? AND status = 'staged'",
+                        (time.time(), campaign_id)
+                    )
+                    total = 0
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued' WHERE campaign_id = ? AND status = 'staged'", (campaign_id,))
+                db.execute("UPDATE campaigns SET total = ? WHERE id = ?", (total, campaign_id))
+        except BaseException:
+            with self._write() as db:
+                db.execute("DELETE FROM jobs WHERE campaign_id = ?", (campaign_id,))
+                db.execute("DELETE FROM campaigns WHERE id = ?", (campaign_id,))
+            raise
+        return campaign_id, total
+
+    def claim(self, session_id, limit=10):
+        """Take up to `limit` ready jobs for a session, highest priority first."""
+        now = time.time()
+        with self._write() as db:
+            rows = db.execute(
+                "SELECT j.id, j.campaign_id, j.phone, j.name, j.message, "
+                "c.message AS template, c.media_path, c.resume "
+                "FROM jobs j JOIN campaigns c ON c.id = j.campaign_id "
+                "WHERE j.session_id = ? AND j.status = 'queued' AND j.not_before <= ? "
+                "ORDER BY j.priority DESC, j.not_before, j.id LIMIT ?",
+                (session_id, now, limit)
+            ).fetchall()
+            db.executemany(
+                "UPDATE jobs SET status = 'claimed', claimed_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows]
+            )
+        return [dict(row) for row in rows]
+
+    def finish(self, job_id, status):
+        """Record a claimed job's outcome: "sent", "failed" or "skipped"."""
+        with self._write() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = 'claimed'",
+                (status, time.time(), job_id)
+            )
+
+    def release(self, job_ids):
+        """Put claimed jobs back in the queue untouched."""
+        with self._write() as db:
+            db.executemany(
+                "UPDATE jobs SET status = 'queued', claimed_at = NULL WHERE id = ? AND status = 'claimed'",
+                [(job_id,) for job_id in job_ids]
+            )
+
+    def requeue_claimed(self, session_id):
+        """Return jobs a dead worker of this session had claimed; returns how many."""
+        with self._write() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'queued', claimed_at = NULL WHERE session_id = ? AND status = 'claimed'",
+                (session_id,)
+            ).rowcount
+
+    def cancel(self, session_id, campaign_id=None):
+        """Cancel a session's queued and staged jobs (of one campaign, or all); returns how many."""
+        query = ("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                 "WHERE session_id = ? AND status IN ('queued', 'staged')")
+        params = [time.time(), session_id]
+        if campaign_id is not None:
+            query += " AND campaign_id = ?"
+            params.append(campaign_id)
+        with self._write() as db:
+            return db.execute(query, params).rowcount
+
+    def next_ready(self, session_id):
+        """Earliest not-before time of the session's queued jobs, or None if there are none."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(not_before) FROM jobs WHERE session_id = ? AND status = 'queued'",
+                (session_id,)
+            ).fetchone()[0]
+
+    def wait(self, timeout):
+        """Block until something is written to the queue or `timeout` seconds pass."""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def wake(self):
+        """Wake every wait() now, e.g. so a stopping worker notices at once."""
+        with self._changed:
+            self._changed.notify_all()
+
+    def stats(self, session_id):
+        """Per-campaign job counts for a session's unfinished campaigns."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT c.id, c.priority, c.not_before, c.total, j.status, COUNT(*) AS n "
+                "FROM campaigns c JOIN jobs j ON j.campaign_id = c.id "
+                "WHERE c.session_id = ? AND c.id IN ("
+                "  SELECT campaign_id FROM jobs WHERE session_id = ? AND status IN ('queued', 'claimed')"
+                ") GROUP BY c.id, j.status ORDER BY c.priority DESC, c.not_before, c.id",
+                (session_id, session_id)
+            ).fetchall()
+        campaigns = {}
+        for row in rows:
+            campaign = campaigns.setdefault(row["id"], {
+                "id": row["id"], "priority": row["priority"],
+                "not_before": row["not_before"], "total": row["total"],
+            })
+            campaign[row["status"]] = row["n"]
+        return list(campaigns.values())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,106 @@
+"""Crash-safe per-session record of campaign outcomes."""
+import dbm
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def campaign_key(message, media_path=None):
+    """Stable id for a campaign, so a resume only skips contacts of the same message."""
+    media = os.path.basename(media_path) if media_path else ""
+    return hashlib.sha1(f"{message}\0{media}".encode("utf-8")).hexdigest()[:12]
+
+
+class SendJournal:
+    """Append-only, crash-safe record of each contact's outcome for one session.
+    
+    Outcomes are written as JSON lines and fsynced in batches. Delivered
+    numbers are also kept in a dbm index next to the journal, together with
+    the journal offset it covers, so opening the journal after a crash only
+    replays the lines written since the last index sync.
+    """
+    
+    def __init__(self, directory, batch_size=20, flush_interval=2.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "journal.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_sent = set()
+        self._last_flush = time.time()
+        self._drop_partial_line()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._index = dbm.open(os.path.join(directory, "delivered"), "c")
+        self._catch_up()
+    
+    def _drop_partial_line(self):
+        """Truncate a line left half-written by a crash."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+    
+    def _catch_up(self):
+        """Index delivered entries the journal has beyond the index's offset."""
+        offset = int(self._index.get(b"__offset__", b"0"))
+        if offset > os.path.getsize(self.path):
+            offset = 0  # Journal was replaced; rebuild from scratch
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                entry = json.loads(line)
+                if entry["status"] == "sent":
+                    self._index[f"{entry['campaign']}:{entry['phone']}"] = b"1"
+            self._index[b"__offset__"] = str(f.tell()).encode()
+        self._sync_index()
+    
+    def _sync_index(self):
+        sync = getattr(self._index, "sync", None)
+        if sync:
+            sync()
+    
+    def record(self, campaign, phone, name, status, **extra):
+        """Buffer one outcome, flushing when the batch is full or old enough."""
+        entry = {"ts": round(time.time(), 3), "campaign": campaign, "phone": phone, "name": name, "status": status}
+        entry.update(extra)
+        with self._lock:
+            self._pending.append(entry)
+            if status == "sent":
+                self._pending_sent.add(f"{campaign}:{phone}")
+            due = (len(self._pending) >= self.batch_size
+                   or time.time() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+    
+    def flush(self):
+        """Write and fsync buffered outcomes, then update the delivered index."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._file.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self._pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for key in self._pending_sent:
+                self._index[key] = b"1"
+            self._index[b"__offset__"] = str(self._file.tell()).encode()
+            self._sync_index()
+            self._pending = []
+            self._pending_sent = set()
+            self._last_flush = time.time()
+    
+    def is_delivered(self, campaign, phone):
+        """Whether this campaign already reached this number."""
+        key = f"{campaign}:{phone}"
+        with self._lock:
+            return key in self._pending_sent or key.encode() in self._index
+    
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._file.close()
+            self._index.close()
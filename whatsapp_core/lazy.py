@@ -0,0 +1,33 @@
+"""Deferred imports, so loading the core stays cheap until a capability is used."""
+import importlib
+
+
+class LazyImport:
+    """A module, or one attribute of it, that is imported on first use.
+
+    `pd = LazyImport("pandas")` stands in for `import pandas as pd`, and
+    `By = LazyImport("selenium.webdriver.common.by", "By")` for the matching
+    from-import. Nothing is imported until an attribute is read or the
+    object is called; resolve() returns the real object.
+    """
+
+    def __init__(self, module, attr=None):
+        self._module = module
+        self._attr = attr
+        self._value = None
+
+    def resolve(self):
+        if self._value is None:
+            value = importlib.import_module(self._module)
+            self._value = getattr(value, self._attr) if self._attr else value
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        target = f"{self._module}.{self._attr}" if self._attr else self._module
+        return f"<LazyImport {target}{'' if self._value is None else ' (loaded)'}>"
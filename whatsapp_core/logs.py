@@ -0,0 +1,63 @@
+"""Bounded in-memory log shared by services and the orchestrator."""
+import collections
+import itertools
+import os
+import threading
+import time
+
+
+def default_log(message, level="info", contact=None, phase=None):
+    """Log for helpers used without a service or orchestrator: print unless WHATSAPP_QUIET is set."""
+    if not os.environ.get("WHATSAPP_QUIET"):
+        print(message)
+
+
+class LogBuffer:
+    """Fixed-capacity ring of structured log records.
+    
+    Every record gets a monotonically increasing sequence number, so pollers
+    can ask for everything after the last number they saw and learn how many
+    records rolled out of the buffer in between.
+    """
+    
+    def __init__(self, capacity=1000):
+        self._records = collections.deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    def append(self, message, level="info", contact=None, phase=None):
+        """Add a record and return it."""
+        with self._lock:
+            self._seq += 1
+            record = {
+                "seq": self._seq, "ts": round(time.time(), 3), "level": level,
+                "message": message, "contact": contact, "phase": phase,
+            }
+            self._records.append(record)
+            return record
+    
+    def since(self, seq=0, limit=None):
+        """Records newer than seq, the cursor for the next call, and how many were missed."""
+        with self._lock:
+            first = self._records[0]["seq"] if self._records else self._seq + 1
+            start = max(seq + 1, first)
+            records = list(itertools.islice(self._records, start - first, None))
+            missed = max(0, first - seq - 1)
+            last = self._seq
+        if limit is not None and len(records) > limit:
+            records = records[:limit]
+            last = records[-1]["seq"]
+        return records, last, missed
+    
+    def tail(self, count):
+        """The last `count` messages as plain strings."""
+        with self._lock:
+            start = max(0, len(self._records) - count)
+            return [r["message"] for r in itertools.islice(self._records, start, None)]
+    
+    @property
+    def last_seq(self):
+        return self._seq
+    
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,132 @@
+"""One-off validation and compression of campaign attachments."""
+import hashlib
+import mimetypes
+import os
+import shutil
+import subprocess
+
+from .logs import default_log
+
+MEDIA_ACCEPT = "image/*,video/mp4,video/3gpp,video/quicktime"  # accept attribute of WhatsApp's media input
+
+
+def _discard(path):
+    """Remove a partial file if one was left behind."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MediaStage:
+    """Validate and shrink a campaign attachment once, caching the result by content hash.
+    
+    The file's type must be one WhatsApp's media input accepts. Images are
+    downscaled and re-encoded with Pillow, and videos over the target size are
+    transcoded with ffmpeg, when those are available; otherwise the original
+    is used. Results live in cache_dir keyed by the source's SHA-256 and the
+    settings, so every contact and every later campaign reuses the same file.
+    """
+    
+    def __init__(self, cache_dir="./whatsapp_sessions/media_cache", max_image_side=1600,
+                 image_quality=80, target_video_bytes=16 * 1024 * 1024, log=default_log):
+        self.cache_dir = cache_dir
+        self.log = log  # A service's or orchestrator's log(), so quiet mode covers it
+        self.max_image_side = max_image_side
+        self.image_quality = image_quality
+        self.target_video_bytes = target_video_bytes
+    
+    @staticmethod
+    def check(path):
+        """Return the file's MIME type, raising ValueError if WhatsApp would not accept it."""
+        if not os.path.isfile(path):
+            raise ValueError(f"Media file not found: {path}")
+        mime = mimetypes.guess_type(path)[0] or ""
+        for pattern in MEDIA_ACCEPT.split(","):
+            if mime == pattern or (pattern.endswith("/*") and mime.startswith(pattern[:-1])):
+                return mime
+        raise ValueError(f"Unsupported media type {mime or 'unknown'} (allowed: {MEDIA_ACCEPT})")
+    
+    def prepare(self, path):
+        """Validate, shrink and cache `path`; returns the prepared file and byte counts."""
+        mime = self.check(path)
+        digest = hashlib.sha256(
+            f"{self.max_image_side}:{self.image_quality}:{self.target_video_bytes}:".encode()
+        )
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        
+        original = os.path.getsize(path)
+        ext = os.path.splitext(path)[1].lower()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached = None
+        for name in os.listdir(self.cache_dir):
+            # A .tmp file is a write that never finished
+            if name.startswith(digest.hexdigest()[:32] + ".") and not name.endswith(".tmp"):
+                cached = os.path.join(self.cache_dir, name)
+        
+        hit = cached is not None
+        if not hit:
+            base = os.path.join(self.cache_dir, digest.hexdigest()[:32])
+            if mime.startswith("image/") and mime != "image/gif":
+                cached = self._shrink_image(path, base, ext)
+            elif mime.startswith("video/") and original > self.target_video_bytes:
+                cached = self._shrink_video(path, base, ext)
+            else:
+                cached = None
+            if cached is None or os.path.getsize(cached) >= original:
+                if cached:
+                    os.remove(cached)
+                cached = base + ext
+                shutil.copyfile(path, cached + ".tmp")
+                os.replace(cached + ".tmp", cached)
+        
+        size = os.path.getsize(cached)
+        return {
+            "path": cached, "mime": mime, "cached": hit,
+            "original_bytes": original, "bytes": size, "saved_bytes": original - size,
+        }
+    
+    def _shrink_image(self, path, base, ext):
+        """Downscale and re-encode an image; None if Pillow is missing or fails."""
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            return None
+        target = base + (".png" if ext == ".png" else ".jpg")
+        try:
+            with Image.open(path) as source:
+                # Re-encoding drops EXIF, so apply its orientation to the pixels first
+                image = ImageOps.exif_transpose(source)
+                image.thumbnail((self.max_image_side, self.max_image_side))
+                if target.endswith(".jpg"):
+                    image.convert("RGB").save(target + ".tmp", "JPEG", quality=self.image_quality, optimize=True)
+                else:
+                    image.save(target + ".tmp", "PNG", optimize=True)
+            os.replace(target + ".tmp", target)
+            return target
+        except Exception as e:
+            _discard(target + ".tmp")
+            self.log(f"Image compression failed, sending original: {e}", level="warning")
+            return None
+    
+    def _shrink_video(self, path, base, ext):
+        """Transcode a video to H.264 at 720p; None if ffmpeg is missing or fails."""
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            return None
+        target = base + ".mp4"
+        try:
+            subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-i", path, "-vf", "scale=-2:'min(720,ih)'",
+                 "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-c:a", "aac", "-b:a", "96k",
+                 "-movflags", "+faststart", "-f", "mp4", target + ".tmp"],
+                check=True, timeout=600
+            )
+            os.replace(target + ".tmp", target)
+            return target
+        except Exception as e:
+            _discard(target + ".tmp")
+            self.log(f"Video transcoding failed, sending original: {e}", level="warning")
+            return None
@@ -0,0 +1,141 @@
+"""Send latency histograms, throughput and Prometheus export."""
+import bisect
+import collections
+import threading
+import time
+
+
+class LatencyHistogram:
+    """Latency histogram with fixed geometric buckets.
+    
+    Recording is a bisect plus a counter bump, so it is cheap enough to run
+    on every phase of every send. Quantiles are read from the buckets and
+    are interpolated within a bucket, so they are accurate to a fraction of
+    one bucket width (buckets grow by 25%).
+    """
+    
+    BOUNDS = tuple(round(0.001 * 1.25 ** i, 6) for i in range(58))  # 1 ms .. ~400 s
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+    
+    def quantile(self, q):
+        """Estimate the q-th quantile, interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.BOUNDS):
+                    return round(self.max, 3)
+                lower = self.BOUNDS[i - 1] if i else 0.0
+                value = lower + (self.BOUNDS[i] - lower) * (rank - seen) / n
+                return round(min(value, self.max), 3)
+            seen += n
+        return round(self.max, 3)
+
+
+class SendMetrics:
+    """Per-phase latency histograms, outcome counters and throughput for one session."""
+    
+    PHASES = ("navigate", "chat_open", "attach", "media_ready", "type", "send", "outbox", "delay")
+    BOUNDS_TEXT = tuple(f"{b:g}" for b in LatencyHistogram.BOUNDS)
+    
+    def __init__(self, window=300):
+        self.window = window  # Seconds of history behind the throughput figure
+        self.phases = {phase: LatencyHistogram() for phase in self.PHASES}
+        self.contact = LatencyHistogram()  # Whole send_message call
+        self.outcomes = collections.Counter()
+        self._sent_at = collections.deque(maxlen=10000)
+        self._lock = threading.Lock()
+    
+    def record(self, phase, seconds):
+        with self._lock:
+            self.phases.setdefault(phase, LatencyHistogram()).record(seconds)
+    
+    def record_send(self, timings, success):
+        """Record one send_message call's phase timings and outcome."""
+        with self._lock:
+            for phase, seconds in timings.items():
+                self.phases.setdefault(phase, LatencyHistogram()).record(seconds)
+            self.contact.record(sum(timings.values()))
+            self.outcomes["sent" if success else "failed"] += 1
+            if success:
+                self._sent_at.append(time.monotonic())
+    
+    def throughput(self):
+        """Messages sent per minute over the last `window` seconds."""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._sent_at and self._sent_at[0] < cutoff:
+                self._sent_at.popleft()
+            return round(len(self._sent_at) * 60 / self.window, 2)
+    
+    def snapshot(self):
+        """p50/p95/p99 per phase plus totals, for get_status()."""
+        def summary(h):
+            return {
+                "count": h.count,
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                "mean": round(h.sum / h.count, 3) if h.count else None,
+            }
+        throughput = self.throughput()
+        with self._lock:
+            return {
+                "phases": {p: summary(h) for p, h in self.phases.items() if h.count},
+                "per_contact": summary(self.contact),
+                "sent": self.outcomes["sent"],
+                "failed": self.outcomes["failed"],
+                "per_minute": throughput,
+            }
+    
+    def prometheus(self, labels):
+        """Prometheus text-format samples for this session (without HELP/TYPE headers)."""
+        lines = {"phase": [], "messages": [], "throughput": []}
+        throughput = self.throughput()
+        with self._lock:
+            for phase, h in self.phases.items():
+                if not h.count:
+                    continue
+                tag = f'{labels},phase="{phase}"'
+                cumulative = 0
+                for bound, n in zip(self.BOUNDS_TEXT, h.counts):
+                    cumulative += n
+                    lines["phase"].append(f'whatsapp_send_phase_seconds_bucket{{{tag},le="{bound}"}} {cumulative}')
+                lines["phase"].append(f'whatsapp_send_phase_seconds_bucket{{{tag},le="+Inf"}} {h.count}')
+                lines["phase"].append(f'whatsapp_send_phase_seconds_sum{{{tag}}} {h.sum:.6f}')
+                lines["phase"].append(f'whatsapp_send_phase_seconds_count{{{tag}}} {h.count}')
+            for outcome in ("sent", "failed"):
+                lines["messages"].append(f'whatsapp_messages_total{{{labels},outcome="{outcome}"}} {self.outcomes[outcome]}')
+        lines["throughput"].append(f'whatsapp_messages_per_minute{{{labels}}} {throughput}')
+        return lines
+
+
+def render_prometheus(services):
+    """Metrics for all given services in Prometheus text exposition format."""
+    headers = {
+        "phase": ("whatsapp_send_phase_seconds", "histogram", "Seconds spent in each send_message phase"),
+        "messages": ("whatsapp_messages_total", "counter", "Messages by outcome"),
+        "throughput": ("whatsapp_messages_per_minute", "gauge", "Messages sent per minute over the last window"),
+    }
+    samples = {key: [] for key in headers}
+    for service in services:
+        session = str(service.session_id).replace("\\", "\\\\").replace('"', '\\"')
+        for key, lines in service.metrics.prometheus(f'session="{session}"').items():
+            samples[key].extend(lines)
+    out = []
+    for key, (name, kind, text) in headers.items():
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(samples[key])
+    return "\n".join(out) + "\n"
@@ -0,0 +1,306 @@
+"""Run one campaign across several linked sessions."""
+import collections
+import itertools
+import os
+import threading
+import time
+
+from .contacts import MessageTemplate
+from .journal import campaign_key
+from .logs import LogBuffer
+from .media import MediaStage
+
+
+class CampaignOrchestrator:
+    """Run one campaign across several linked WhatsApp sessions at once.
+    
+    Every connected session pulls its next contact from one shared, lazily
+    read contact stream, so the list is sharded dynamically: a fast session
+    simply takes more work, and a session that stalls or disconnects stops
+    pulling while the others drain what is left. Contacts taken back from a
+    retired session are retried first.
+    """
+    
+    def __init__(self, services, stall_timeout=90, echo_logs=None):
+        self.services = list(services)
+        self.stall_timeout = stall_timeout  # Seconds one contact may take before the session is retired
+        self.is_running = False
+        self.should_stop = False
+        self.paused = False
+        self.resume = False
+        self.progress = {"sent": 0, "failed": 0, "total": 0, "remaining": 0}
+        self.sessions = {}
+        self.logs = LogBuffer(int(os.environ.get("LOG_CAPACITY", 1000)))
+        self.echo_logs = not os.environ.get("WHATSAPP_QUIET") if echo_logs is None else echo_logs
+        self._contacts = iter(())
+        self._requeued = collections.deque()
+        self._registries = []
+        self._lock = threading.Lock()
+        self._contacts_lock = threading.Lock()  # Held while the contact stream is read
+        self._threads = []
+    
+    def log(self, message, level="info", contact=None, phase=None):
+        """Add a log message."""
+        self.logs.append(message, level, contact, phase)
+        if self.echo_logs:
+            print(message)
+    
+    def get_logs(self, since=0, limit=None):
+        """Structured log records after sequence number `since`.
+        
+        Pass the returned "next" value as `since` on the following call;
+        "missed" counts records that rolled out of the buffer in between.
+        """
+        records, last, missed = self.logs.since(since, limit)
+        return {"logs": records, "next": last, "missed": missed}
+    
+    def start(self, contacts, message, count, media_path=None, resume=False):
+        """Shard the top `count` valid contacts of a ContactSource across all connected sessions.
+        
+        With resume=True, contacts any session's journal shows this message
+        already reached are skipped. Messages are rendered per contact from
+        the template before they are handed to a session.
+        """
+        if self.is_running:
+            self.log("⚠️ Campaign already running", level="warning")
+            return False
+        
+        try:
+            template = MessageTemplate(message).bind(contacts.header)
+            media = MediaStage(log=self.log).prepare(media_path) if media_path else None
+        except ValueError as e:
+            self.log(f"❌ {e}", level="error")
+            return False
+        
+        # Sessions already sending their own queue keep it to themselves
+        services = [s for s in self.services if not s.is_running and s.check_connection()]
+        if not services:
+            self.log("❌ No connected sessions", level="error")
+            return False
+        
+        total = min((contacts.stats or contacts.validate())["valid"], count)
+        self._contacts = itertools.islice(contacts.iter_valid(template=template), total)
+        self._requeued = collections.deque()
+        self._campaign = campaign_key(message, media["path"] if media else None)
+        self.resume = resume
+        # Sessions normally share one number registry; consult each distinct one once
+        self._registries = list({id(s.number_registry): s.number_registry for s in services}.values())
+        self.progress = {"sent": 0, "failed": 0, "total": total, "remaining": total}
+        self.sessions = {}
+        self.should_stop = False
+        self.paused = False
+        self.is_running = True
+        self.log(f"🚀 Sharding {total} contacts across {len(services)} sessions...")
+        
+        self._threads = []
+        for service in services:
+            service.message_template = message
+            service.media_path = None
+            service.media = None
+            if media:
+                service.prepare_media(media_path, media)
+            service.campaign = self._campaign
+            service.should_stop = False
+            service.paused = False
+            service.is_running = True
+            service.progress.reset(sent=0, total=total, current="", delivered=0, unconfirmed=0)
+            self.sessions[service.session_id] = {
+                "status": "running", "sent": 0, "failed": 0,
+                "current": "", "in_flight": None, "since": None,
+            }
+            thread = threading.Thread(target=self._worker, args=(service,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        
+        monitor = threading.Thread(target=self._monitor)
+        monitor.daemon = True
+        monitor.start()
+        return True
+    
+    def _worker(self, service):
+        """Pull contacts from the shared queue and send them on one session."""
+        state = self.sessions[service.session_id]
+        try:
+            while not self.should_stop and state["status"] == "running":
+                if not service._hold():
+                    break
+                contact = self._next_contact()
+                with self._lock:
+                    pending = any(s["in_flight"] for s in self.sessions.values())
+                if contact is None:
+                    # Stay around while another session could still hand work back
+                    if not pending:
+                        break
+                    time.sleep(1)
+                    continue
+                
+                with self._lock:
+                    state["in_flight"] = contact
+                    state["since"] = time.time()
+                    state["current"] = f"{contact[1]} ({contact[0]})"
+                
+                success = service.send_message(*contact)
+                
+                with self._lock:
+                    state["in_flight"] = None
+                    state["since"] = None
+                    retired = state["status"] != "running"
+                
+                if service.last_error == "cancelled" or (retired and "send" not in service.last_timings):
+                    # Paused, stopped or retired before the send click; the contact goes back for later
+                    with self._lock:
+                        self._requeued.appendleft(contact)
+                    continue
+                
+                if retired:
+                    # The monitor gave up on this session, but the send went through late
+                    self.log(f"⚠️ Session {service.session_id} finished a contact after it stalled: {contact[1]}", level="warning")
+                elif not success and not service.check_connection():
+                    self._retire(service.session_id, contact, "disconnected")
+                    break
+                
+                service.record_outcome(contact.phone, contact.name, success)
+                with self._lock:
+                    key = "sent" if success else "failed"
+                    state[key] += 1
+                    self.progress[key] += 1
+                    self.progress["remaining"] -= 1
+                    if success:
+                        service.progress.add("sent")
+                
+                if retired:
+                    break
+                service._pace(success)
+        except Exception as e:
+            self.log(f"❌ Session {service.session_id} worker error: {e}", level="error")
+            with self._lock:
+                state["status"] = "failed"
+        finally:
+            with self._lock:
+                if state["status"] == "running":
+                    state["status"] = "stopped" if self.should_stop else "done"
+            if service.journal:
+                service.journal.flush()
+            service.is_running = False
+            self._finish_if_idle()
+    
+    def _next_contact(self):
+        """Next contact to send, requeued ones first.
+        
+        The contact stream is read under its own lock: reading and rendering a
+        chunk and the journal and registry lookups can take a while, and must
+        not hold up the monitor, get_status() or other sessions' bookkeeping.
+        """
+        with self._lock:
+            if self._requeued:
+                return self._requeued.popleft()
+        with self._contacts_lock:
+            for contact in self._contacts:
+                if self.resume and any(
+                    s._open_journal().is_delivered(self._campaign, contact.phone) for s in self.services
+                ):
+                    skipped = "sent"
+                elif any(registry.is_invalid(contact.phone) for registry in self._registries):
+                    # Known not to be on WhatsApp; no session needs to open the chat
+                    skipped = "failed"
+                else:
+                    return contact
+                with self._lock:
+                    self.progress[skipped] += 1
+                    self.progress["remaining"] -= 1
+        return None
+    
+    def _monitor(self):
+        """Retire sessions whose in-flight contact is taking too long."""
+        while self.is_running:
+            now = time.time()
+            with self._lock:
+                stalled = [
+                    (session_id, state["in_flight"])
+                    for session_id, state in self.sessions.items()
+                    if state["status"] == "running" and state["since"]
+                    and now - state["since"] > self.stall_timeout
+                ]
+            for session_id, contact in stalled:
+                # The send may still go through, so the contact stays with the
+                # session; its worker requeues it if the send returns unclicked
+                self._retire(session_id, None, "stalled")
+            time.sleep(1)
+    
+    def _retire(self, session_id, contact, reason):
+        """Stop routing work to a session and requeue `contact`, if given."""
+        with self._lock:
+            state = self.sessions[session_id]
+            if state["status"] != "running":
+                return
+            state["status"] = reason
+            if contact is not None:
+                state["in_flight"] = None
+                state["since"] = None
+            active = [s for s in self.sessions.values() if s["status"] == "running"]
+        
+        self.log(f"⚠️ Session {session_id} {reason}, rebalancing to {len(active)} remaining sessions", level="warning")
+        for service in self.services:
+            if service.session_id == session_id:
+                service.should_stop = True
+        if contact is not None:
+            with self._lock:
+                self._requeued.append(contact)
+        self._finish_if_idle()
+    
+    def _finish_if_idle(self):
+        """Mark the campaign finished once no session is still running."""
+        with self._lock:
+            if not self.is_running:
+                return
+            # A stalled session's send may still return and hand its contact back
+            if any(s["status"] == "running" or s["in_flight"] for s in self.sessions.values()):
+                return
+            self.is_running = False
+        
+        if self.should_stop:
+            self.log("🛑 Stopped by user")
+        elif self.progress["remaining"] > 0:
+            self.log(f"❌ All sessions retired with {self.progress['remaining']} contacts left", level="error")
+        self.log(f"✅ Done! Sent {self.progress['sent']}/{self.progress['total']} messages")
+    
+    def stop(self):
+        """Stop every session in the campaign."""
+        self.should_stop = True
+        for service in self.services:
+            service.should_stop = True
+        self.log("Stopping...")
+    
+    def pause_sending(self):
+        """Hold every session; contacts interrupted before their send click are retried on resume."""
+        self.paused = True
+        for service in self.services:
+            if service.session_id in self.sessions:
+                service.pause_sending()
+        self.log("⏸️ Paused")
+    
+    def resume_sending(self):
+        """Continue a paused campaign."""
+        self.paused = False
+        for service in self.services:
+            if service.session_id in self.sessions:
+                service.resume_sending()
+        self.log("▶️ Resumed")
+    
+    def get_status(self):
+        """Get merged status across all sessions."""
+        with self._lock:
+            sessions = {
+                session_id: {k: v for k, v in state.items() if k not in ("in_flight", "since")}
+                for session_id, state in self.sessions.items()
+            }
+            progress = dict(self.progress)
+        return {
+            "running": self.is_running,
+            "paused": self.paused,
+            "progress": progress,
+            "sessions": sessions,
+            "logs": self.logs.tail(20),  # Last 20 logs
+            "log_seq": self.logs.last_seq
+        }
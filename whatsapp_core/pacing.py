@@ -0,0 +1,131 @@
+"""Per-session send pacing and Chrome memory governance."""
+import random
+import threading
+import time
+
+from .browser import process_tree_rss
+
+
+class RateController:
+    """Pace one session's sends with a token bucket that adapts AIMD-style.
+    
+    The rate (messages per hour) climbs additively after each clean send and
+    is cut multiplicatively after a failure, a slow chat load or a rate-limit
+    banner, staying between min_per_hour and max_per_hour. Each cut also
+    imposes a backoff pause that doubles while problems keep coming. Delays
+    get random jitter so sends don't land on a fixed beat.
+    
+    Any object with record(), next_delay() and snapshot() can stand in for it.
+    """
+    
+    def __init__(self, max_per_hour=900, min_per_hour=60, start_per_hour=600,
+                 increase=20, decrease=0.5, jitter=0.3, slow_after=8.0,
+                 base_backoff=5.0, max_backoff=300.0):
+        self.max_per_hour = max_per_hour
+        self.min_per_hour = min_per_hour
+        self.increase = increase  # Messages/hour added per clean send
+        self.decrease = decrease  # Rate multiplier on a problem
+        self.jitter = jitter
+        self.slow_after = slow_after  # Chat loads slower than this count as a problem
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.rate = min(start_per_hour, max_per_hour)
+        self.tokens = 1.0
+        self.backoff = 0.0
+        self.backoff_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def record(self, success, latency=None, rate_limited=False):
+        """Adjust the rate after a send; latency is the chat load time in seconds."""
+        with self._lock:
+            slow = latency is not None and latency > self.slow_after
+            if success and not slow and not rate_limited:
+                self.rate = min(self.max_per_hour, self.rate + self.increase)
+                self.backoff = 0.0
+                return
+            self.rate = max(self.min_per_hour, self.rate * self.decrease)
+            floor = self.base_backoff * (12 if rate_limited else 1)
+            self.backoff = min(self.max_backoff, max(floor, self.backoff * 2))
+            self.backoff_until = time.monotonic() + self.backoff
+    
+    def next_delay(self):
+        """Seconds to wait before the next send; takes one token."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(1.0, self.tokens + (now - self._last) * self.rate / 3600)
+            wait = max(0.0, (1 - self.tokens) * 3600 / self.rate)
+            wait *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            wait = max(wait, self.backoff_until - now)
+            self.tokens += wait * self.rate / 3600 - 1
+            self._last = now + wait
+            return wait
+    
+    def snapshot(self):
+        """Current rate and backoff state."""
+        with self._lock:
+            return {
+                "rate_per_hour": round(self.rate, 1),
+                "max_per_hour": self.max_per_hour,
+                "backoff": round(self.backoff, 1),
+                "backoff_remaining": round(max(0.0, self.backoff_until - time.monotonic()), 1),
+            }
+
+
+class MemoryGovernor:
+    """Keep one session's Chrome from growing until the host runs out of memory.
+    
+    check() runs between contacts. At most every `interval` seconds it samples
+    the resident memory of chromedriver and every Chrome process under it.
+    Above trim_mb it asks the session to drop in-memory caches; above
+    restart_mb it asks for a browser restart on the same profile, at most
+    once per `cooldown` seconds so a profile that is simply big does not
+    restart in a loop.
+    """
+    
+    def __init__(self, trim_mb=800, restart_mb=1200, interval=15.0, cooldown=300.0):
+        self.trim_mb = trim_mb
+        self.restart_mb = restart_mb
+        self.interval = interval
+        self.cooldown = cooldown
+        self.mb = None  # Last sample
+        self.peak_mb = None
+        self.trims = 0
+        self.restarts = 0
+        self._sampled = float("-inf")
+        self._restarted = float("-inf")
+        self._lock = threading.Lock()
+    
+    def check(self, pid):
+        """Sample if due; returns None, "trim" or "restart"."""
+        with self._lock:
+            now = time.monotonic()
+            if pid is None or now - self._sampled < self.interval:
+                return None
+            self._sampled = now
+        rss = process_tree_rss(pid)
+        if rss is None:
+            return None
+        with self._lock:
+            self.mb = round(rss / 2 ** 20, 1)
+            self.peak_mb = max(self.peak_mb or 0, self.mb)
+            if self.mb >= self.restart_mb and now - self._restarted >= self.cooldown:
+                self.restarts += 1
+                self._restarted = now
+                return "restart"
+            if self.mb >= self.trim_mb:
+                self.trims += 1
+                return "trim"
+            return None
+    
+    def snapshot(self):
+        """Last and peak memory plus how often the governor stepped in."""
+        with self._lock:
+            return {
+                "mb": self.mb,
+                "peak_mb": self.peak_mb,
+                "trim_mb": self.trim_mb,
+                "restart_mb": self.restart_mb,
+                "trims": self.trims,
+                "restarts": self.restarts,
+            }
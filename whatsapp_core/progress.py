@@ -0,0 +1,39 @@
+"""Campaign counters shared between the worker and its readers."""
+import threading
+
+
+class Progress:
+    """Named counters updated from several threads and read as one snapshot.
+
+    The send loop, the delivery tracker and orchestrator workers all move
+    the same counters while status requests read them, so every change goes
+    through the lock and readers get a consistent copy instead of a dict
+    that may change while it is being serialized.
+    """
+
+    def __init__(self, **values):
+        self._values = dict(values)
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        """Increase a counter and return its new value."""
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            return self._values[key]
+
+    def set(self, **values):
+        with self._lock:
+            self._values.update(values)
+
+    def reset(self, **values):
+        """Replace every counter at once."""
+        with self._lock:
+            self._values = dict(values)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._values[key]
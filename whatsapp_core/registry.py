@@ -0,0 +1,86 @@
+"""Persistent cache of which numbers are on WhatsApp."""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS numbers (
+    phone TEXT PRIMARY KEY,
+    registered INTEGER NOT NULL,
+    checked REAL NOT NULL
+);
+"""
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def default_number_registry():
+    """The process-wide NumberRegistry at NUMBER_CACHE_PATH, opened on first use."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = NumberRegistry(
+                os.environ.get("NUMBER_CACHE_PATH", "./whatsapp_sessions/numbers.db"),
+                ttl=float(os.environ.get("NUMBER_CACHE_TTL_DAYS", 30)) * 86400
+            )
+        return _default_registry
+
+
+def number_key(phone):
+    """Cache key for a phone number: its digits, as in E.164 without the plus."""
+    return "".join(filter(str.isdigit, str(phone)))
+
+
+class NumberRegistry:
+    """Verdicts on whether numbers have WhatsApp, kept in SQLite for `ttl` seconds.
+
+    Verdicts come from registration checks and from every chat a campaign
+    opens, so later campaigns can skip known-invalid numbers without
+    loading their chat. Expired verdicts read as unknown.
+    """
+
+    def __init__(self, path, ttl=30 * 86400):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, phone):
+        """True/False if a fresh verdict is cached for phone, else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT registered FROM numbers WHERE phone = ? AND checked >= ?",
+                (number_key(phone), time.time() - self.ttl)
+            ).fetchone()
+        return None if row is None else bool(row[0])
+
+    def is_invalid(self, phone):
+        """Whether phone is known, and recently, not to be on WhatsApp."""
+        return self.get(phone) is False
+
+    def put(self, phone, registered):
+        """Store a fresh verdict for phone."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO numbers (phone, registered, checked) VALUES (?, ?, ?)",
+                (number_key(phone), int(registered), time.time())
+            )
+
+    def stats(self):
+        """Fresh verdict counts."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT registered, COUNT(*) FROM numbers WHERE checked >= ? GROUP BY registered",
+                (time.time() - self.ttl,)
+            ).fetchall()
+        counts = dict(rows)
+        return {"registered": counts.get(1, 0), "unregistered": counts.get(0, 0)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,1349 @@
+"""One linked WhatsApp Web session driven through Selenium."""
+import base64
+import itertools
+import os
+import random
+import threading
+import time
+import unicodedata
+
+from .browser import (
+    CHAT_STATUSES_JS, COMPOSER_XPATH, OPEN_NEW_CHAT_JS, COMPOSER_TEXT_JS, PASTE_JS, CLEAR_COMPOSER_JS,
+    QR_CANVAS_XPATH, QR_FINGERPRINT_JS, SCRIPT_TIMEOUT, SEARCH_BOX_XPATH, STATE_JS,
+    WAIT_JS, WHATSAPP_WEB_URL, is_session_lost, launch_driver, trim_profile_caches,
+)
+from .contacts import UPLOAD_DIR, ContactSource, MessageTemplate, spool_upload
+from .delivery import DeliveryTracker
+from .jobs import default_job_queue
+from .journal import SendJournal, campaign_key
+from .lazy import LazyImport
+from .logs import LogBuffer
+from .media import MEDIA_ACCEPT, MediaStage
+from .metrics import SendMetrics
+from .pacing import MemoryGovernor, RateController
+from .progress import Progress
+from .registry import default_number_registry
+
+By = LazyImport("selenium.webdriver.common.by", "By")
+Keys = LazyImport("selenium.webdriver.common.keys", "Keys")
+ActionChains = LazyImport("selenium.webdriver.common.action_chains", "ActionChains")
+WebDriverWait = LazyImport("selenium.webdriver.support.ui", "WebDriverWait")
+EC = LazyImport("selenium.webdriver.support.expected_conditions")
+
+CANCEL_SLICE = 0.5  # Longest a page wait runs before checking for stop or pause again
+
+
+class SendCancelled(BaseException):
+    """Stop or pause was requested while a send was still waiting on the page.
+    
+    A BaseException, so the broad `except Exception` around single send
+    steps lets it through to _send_message.
+    """
+
+
+def _comparable(text):
+    """Normalize composer text for comparison, line by line.
+    
+    Runs of spaces and tabs collapse to one and emoji variation selectors are
+    ignored, but line breaks must match, so a paste that drops or merges
+    lines does not count as landing intact.
+    """
+    text = unicodedata.normalize("NFC", text or "").replace("\ufe0f", "")
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(" ".join(line.split()) for line in lines).strip("\n")
+
+
+def benchmark_navigation(service, phones, modes=("reload", "in_app")):
+    """Open each chat in turn under each navigation mode without sending.
+    
+    `service` must be logged in. Returns contacts per minute, chats opened
+    and elapsed seconds for every mode.
+    """
+    results = {}
+    original = service.navigation
+    try:
+        for mode in modes:
+            service.navigation = mode
+            service._in_app_failures = 0
+            opened = 0
+            started = time.perf_counter()
+            for phone in phones:
+                if service._open_chat(''.join(filter(str.isdigit, str(phone)))) == "chat_open":
+                    opened += 1
+            elapsed = time.perf_counter() - started
+            results[mode] = {
+                "contacts_per_minute": round(len(phones) * 60 / elapsed, 1) if elapsed else None,
+                "opened": opened,
+                "seconds": round(elapsed, 2),
+            }
+    finally:
+        service.navigation = original
+    return results
+
+
+class WhatsAppService:
+    def __init__(self, session_id, driver_pool=None, rate_controller=None, echo_logs=None,
+                 memory_governor=None, job_queue=None, number_registry=None):
+        self.session_id = session_id
+        self.session_dir = self._resolve_session_dir()
+        self.driver_pool = driver_pool  # Optional DriverPool for fast startup
+        self.rate_controller = rate_controller or RateController(
+            max_per_hour=int(os.environ.get("MAX_MESSAGES_PER_HOUR", 900))
+        )
+        self.memory_governor = memory_governor or MemoryGovernor(
+            trim_mb=int(os.environ.get("MEMORY_TRIM_MB", 800)),
+            restart_mb=int(os.environ.get("MEMORY_RESTART_MB", 1200))
+        )
+        self._pooled = False
+        self.driver = None
+        self.crashes = 0  # Browser crashes recovered from mid-campaign
+        self._driver_lock = threading.RLock()  # Held for a whole send; background readers wait their turn
+        self.is_connected = False
+        self.page_state = {"state": "closed"}  # Last result of get_state()
+        self.qr_version = 0  # Bumped whenever the QR on screen changes
+        self._qr_fingerprint = None
+        self._qr_image = None
+        self._qr_changed = threading.Condition()
+        self._qr_watcher = None
+        self._qr_waited = 0.0
+        self.is_running = False
+        self._control = threading.Condition()  # Wakes every cancellable wait on stop, pause and resume
+        self._stop_requested = False
+        self.paused = False
+        self._discard_claimed = False  # Whether the last stop also cancelled the queue
+        self.progress = Progress(sent=0, total=0, current="", delivered=0, unconfirmed=0)
+        self.delivery = DeliveryTracker(self._read_chat_statuses, self._delivery_final)
+        self._outbox_open = False  # Last sent message not yet seen leaving the clock state
+        self._job_queue = job_queue  # JobQueue; the shared default_job_queue() if None
+        self.claim_batch = 10  # Jobs claimed per queue transaction
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._enqueuing = 0  # Campaigns whose contacts are still being queued
+        self._stops = 0  # stop_sending() calls so far
+        self._number_registry = number_registry  # NumberRegistry; the shared default_number_registry() if None
+        self.check_progress = None  # Counts of the last registration check, see start_checking()
+        self.logs = LogBuffer(int(os.environ.get("LOG_CAPACITY", 1000)))
+        # Echo to stdout unless WHATSAPP_QUIET is set (or echo_logs=False)
+        self.echo_logs = not os.environ.get("WHATSAPP_QUIET") if echo_logs is None else echo_logs
+        self.contacts = None  # ContactSource
+        # When set, every number without a + or 00 prefix is national: a trunk 0
+        # is replaced by this code and any other number is prefixed with it
+        self.default_country_code = os.environ.get("DEFAULT_COUNTRY_CODE", "")
+        self.message_template = ""
+        self.template = None  # MessageTemplate compiled from message_template
+        self.contact_count = 0
+        self.media_path = None  # Store media file path
+        self.media = None  # Result of MediaStage.prepare() plus per-send upload times
+        self.campaign = None
+        self.journal = None  # SendJournal, opened on first send
+        self.resume = False
+        self.last_timings = {}  # Seconds per phase of the last send_message
+        self.metrics = SendMetrics()
+        self.last_error = None  # Why the last send_message failed or stalled
+        # "reload" loads /send?phone= each time, "in_app" opens chats inside the loaded app
+        # (opt-in until benchmark_navigation() shows it is faster on real sessions)
+        self.navigation = os.environ.get("WHATSAPP_NAVIGATION", "reload")
+        self._in_app_failures = 0
+        # Open the next contact's chat during the pause after a send (queue worker only)
+        self.pipeline = bool(os.environ.get("WHATSAPP_PIPELINE"))
+        self._prefetched = None  # (clean_phone, result of _open_chat, its timings)
+        
+    def log(self, message, level="info", contact=None, phase=None):
+        """Add a log message."""
+        self.logs.append(message, level, contact, phase)
+        if self.echo_logs:
+            print(message)
+    
+    def get_logs(self, since=0, limit=None):
+        """Structured log records after sequence number `since`.
+        
+        Pass the returned "next" value as `since` on the following call;
+        "missed" counts records that rolled out of the buffer in between.
+        """
+        records, last, missed = self.logs.since(since, limit)
+        return {"logs": records, "next": last, "missed": missed}
+    
+    def setup_driver(self):
+        """Initialize Chrome driver with session."""
+        self.log("Initializing WhatsApp Web...")
+        
+        # A brand-new session can take a warm browser instead of launching one
+        if self.driver_pool and not os.path.exists(self.session_dir):
+            pooled = self.driver_pool.acquire()
+            if pooled:
+                self.driver, self.session_dir = pooled
+                self._pooled = True
+                self._claim_pooled_profile()
+                self.log("Using warm browser from pool")
+                return
+        
+        try:
+            self.driver = launch_driver(self.session_dir, self.log)
+        except Exception as e:
+            self.log(f"Failed to start driver: {str(e)}", level="error")
+            raise e
+    
+    def restart_driver(self, timeout=60):
+        """Relaunch Chrome on the same profile and wait for WhatsApp to log back in.
+        
+        The linked account lives in session_dir, so no new QR scan is needed.
+        Returns True once connected again.
+        """
+        old, self.driver = self.driver, None
+        if old:
+            try:
+                old.quit()
+            except Exception:
+                pass
+        # A pooled browser is ours for good once logged in; it never goes back
+        self._pooled = False
+        self.is_connected = False
+        self._in_app_failures = 0
+        self._outbox_open = False
+        trim_profile_caches(self.session_dir)
+        
+        try:
+            self.driver = launch_driver(self.session_dir, self.log)
+        except Exception as e:
+            self.log(f"❌ Could not relaunch browser: {e}", level="error")
+            return False
+        
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.check_connection():
+                return True
+            if self.page_state["state"] == "qr":
+                self.log("❌ Browser restarted but the session is no longer linked (QR showing)", level="error")
+                return False
+            if not self._sleep(0.5):
+                self.log("🛑 Stopped while waiting for the browser to log back in", level="warning")
+                return False
+        self.log(f"❌ Browser restarted but WhatsApp did not log back in ({self.page_state['state']})", level="error")
+        return False
+    
+    def recover_driver(self, attempts=3):
+        """Relaunch a crashed browser on the persisted profile; True once logged in again."""
+        for attempt in range(1, attempts + 1):
+            self.log(f"♻️ Relaunching browser (attempt {attempt}/{attempts})...", level="warning")
+            if self.restart_driver():
+                self.crashes += 1
+                self.log("✅ Browser back, resuming")
+                return True
+            if self.page_state["state"] == "qr" or not self._sleep(2 * attempt):
+                break
+        return False
+    
+    def _browser_lost(self):
+        """Whether the browser session is dead (as opposed to a failed page action)."""
+        if not self.driver:
+            return True
+        try:
+            self.driver.execute_script("return 1;")
+            return False
+        except Exception as e:
+            return is_session_lost(e)
+    
+    def _trim_memory(self):
+        """Ask Chrome to drop caches and collect garbage without reloading."""
+        for command, params in (
+            ("HeapProfiler.collectGarbage", {}),
+            ("Network.clearBrowserCache", {}),
+            ("Memory.simulatePressureNotification", {"level": "critical"}),
+        ):
+            try:
+                self.driver.execute_cdp_cmd(command, params)
+            except Exception:
+                pass
+    
+    def _govern_memory(self):
+        """Between contacts: trim or restart Chrome if the memory governor says so.
+        
+        Returns False if a restart left the session without a logged-in browser.
+        """
+        try:
+            pid = self.driver.service.process.pid
+        except Exception:
+            return True
+        action = self.memory_governor.check(pid)
+        if action == "trim":
+            self.log(f"🧹 Chrome at {self.memory_governor.mb:.0f} MB, trimming caches", level="warning")
+            self._trim_memory()
+        elif action == "restart":
+            self.log(f"♻️ Chrome at {self.memory_governor.mb:.0f} MB, restarting browser", level="warning")
+            with self._driver_lock:
+                # A stop or pause must not abort the flush and escape the send loop
+                self._flush_outbox(cancellable=False)
+                if not self.restart_driver():
+                    return False
+            self.log("✅ Browser restarted, resuming")
+        return True
+    
+    def _profile_marker(self):
+        return f"./whatsapp_sessions/session_{self.session_id}.profile"
+    
+    def _resolve_session_dir(self):
+        """session_<id>, or the pooled profile this session took over (see _claim_pooled_profile)."""
+        try:
+            with open(self._profile_marker(), encoding="utf-8") as f:
+                path = f.read().strip()
+            if os.path.isdir(path):
+                return path
+        except OSError:
+            pass
+        return f"./whatsapp_sessions/session_{self.session_id}"
+    
+    def _claim_pooled_profile(self):
+        """Record the pooled profile as this session's, so later launches reuse its login.
+        
+        A plain marker file rather than a symlink, which needs extra
+        privileges on Windows.
+        """
+        try:
+            with open(self._profile_marker(), "w", encoding="utf-8") as f:
+                f.write(os.path.abspath(self.session_dir))
+        except OSError as e:
+            self.log(f"Warning: Could not record session profile: {e}", level="warning")
+        
+    def get_state(self):
+        """Read the page state in a single round trip.
+        
+        Returns one of "logged_in", "chat_open", "qr", "loading",
+        "phone_offline", "closed" (no browser) or "error"; the full probe
+        result is kept in self.page_state.
+        """
+        if not self.driver:
+            self.page_state = {"state": "closed"}
+        else:
+            try:
+                self.page_state = self.driver.execute_script(STATE_JS)
+            except Exception as e:
+                self.log(f"State check error: {e}", level="error")
+                self.page_state = {"state": "error"}
+        return self.page_state["state"]
+    
+    def check_connection(self):
+        """Check if WhatsApp Web is connected."""
+        was_connected = self.is_connected
+        # Multi-device sessions stay usable while the phone is offline
+        self.is_connected = self.get_state() in ("logged_in", "chat_open", "phone_offline")
+        if self.is_connected and not was_connected:
+            self.log("✅ Connection detected!")
+        return self.is_connected
+    
+    def get_qr_code(self):
+        """Get QR code as base64 image."""
+        try:
+            return self._refresh_qr()
+        except:
+            return None
+    
+    def _refresh_qr(self):
+        """Re-encode the QR only when its fingerprint changed; returns the cached data URI."""
+        if not self.driver:
+            return None
+        fingerprint = self.driver.execute_script(QR_FINGERPRINT_JS)
+        with self._qr_changed:
+            if fingerprint == self._qr_fingerprint:
+                return self._qr_image
+        
+        image = None
+        if fingerprint is not None:
+            # Find QR code canvas and take screenshot of it
+            qr_element = self.driver.find_element(By.XPATH, QR_CANVAS_XPATH)
+            qr_png = qr_element.screenshot_as_png
+            qr_base64 = base64.b64encode(qr_png).decode('utf-8')
+            image = f"data:image/png;base64,{qr_base64}"
+        
+        with self._qr_changed:
+            self._qr_fingerprint = fingerprint
+            self._qr_image = image
+            self.qr_version += 1
+            self._qr_changed.notify_all()
+            return image
+    
+    def wait_for_qr_change(self, version, timeout=25):
+        """Block until the QR differs from `version` (long-poll for frontends).
+        
+        Returns {"version": ..., "qr": data URI or None}; "qr" is None once the
+        code is gone, e.g. after the session links. On timeout the current
+        version is returned unchanged.
+        """
+        with self._qr_changed:
+            self._qr_waited = time.time()
+            if self._qr_watcher is None or not self._qr_watcher.is_alive():
+                self._qr_watcher = threading.Thread(target=self._watch_qr)
+                self._qr_watcher.daemon = True
+                self._qr_watcher.start()
+            self._qr_changed.wait_for(lambda: self.qr_version != version, timeout)
+            return {"version": self.qr_version, "qr": self._qr_image}
+    
+    def _watch_qr(self):
+        """Fingerprint the QR about once a second while anyone is long-polling."""
+        while self.driver and time.time() - self._qr_waited < 60:
+            try:
+                self._refresh_qr()
+            except Exception:
+                pass
+            time.sleep(1)
+    
+    def load_contacts(self, file_content):
+        """Load contacts from Excel/CSV file content (bytes or a file object)."""
+        try:
+            path = spool_upload(file_content, UPLOAD_DIR)
+        except Exception as e:
+            self.log(f"Error loading contacts: {e}", level="error")
+            return False
+        return self.load_contacts_file(path)
+    
+    def load_contacts_file(self, path):
+        """Load contacts from an upload already spooled to `path`; the file is deleted once replaced."""
+        try:
+            try:
+                contacts = ContactSource(path, default_country_code=self.default_country_code)
+            except Exception:
+                os.remove(path)
+                raise
+            if self.contacts is not None:
+                self.contacts.close()
+            self.contacts = contacts
+            self.log(f"Loaded {len(self.contacts)} contacts from {self.contacts.format.upper()}")
+            
+            stats = self.contacts.validate()
+            self.log(
+                f"📋 {stats['valid']} valid numbers, {stats['invalid']} invalid, "
+                f"{stats['duplicates']} duplicates, {stats['blank']} blank"
+            )
+            return True
+        except Exception as e:
+            self.log(f"Error loading contacts: {e}", level="error")
+            return False
+    
+    
+    @property
+    def should_stop(self):
+        return self._stop_requested
+    
+    @should_stop.setter
+    def should_stop(self, value):
+        with self._control:
+            self._stop_requested = value
+            self._control.notify_all()
+    
+    def pause_sending(self):
+        """Hold the campaign; a send not yet clicked is abandoned and retried on resume."""
+        with self._control:
+            self.paused = True
+            self._control.notify_all()
+        self.log("⏸️ Paused")
+    
+    def resume_sending(self):
+        """Continue a paused campaign."""
+        with self._control:
+            self.paused = False
+            self._control.notify_all()
+        self.log("▶️ Resumed")
+    
+    def _check_cancel(self):
+        """Raise SendCancelled if stop or pause was requested."""
+        if self._stop_requested or self.paused:
+            raise SendCancelled()
+    
+    def _sleep(self, seconds):
+        """Sleep, waking at once on stop; returns False if stopped."""
+        with self._control:
+            return not self._control.wait_for(lambda: self._stop_requested, seconds)
+    
+    def _hold(self):
+        """Block while paused; returns False if stopped."""
+        with self._control:
+            self._control.wait_for(lambda: self._stop_requested or not self.paused)
+            return not self._stop_requested
+    
+    def _wait_until(self, condition, timeout):
+        """WebDriverWait for `condition`, given up within one poll of a stop or pause."""
+        def check(driver):
+            self._check_cancel()
+            return condition(driver)
+        return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(check)
+    
+    def _wait_for(self, names, timeout, cancellable=True):
+        """Wait until the page reports one of `names`; returns it, or None on timeout.
+        
+        A cancellable wait asks the page in slices of CANCEL_SLICE seconds and
+        raises SendCancelled between them once stop or pause is requested.
+        """
+        deadline = time.time() + min(timeout, SCRIPT_TIMEOUT - 5)
+        while True:
+            if cancellable:
+                self._check_cancel()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            wait = min(remaining, CANCEL_SLICE) if cancellable else remaining
+            try:
+                ready = self.driver.execute_async_script(WAIT_JS, list(names), int(wait * 1000))
+                if ready is not None or wait >= remaining:
+                    return ready
+            except Exception as e:
+                if is_session_lost(e):
+                    return None
+                # The page swapped documents mid-wait; the probe re-installs on retry
+                time.sleep(0.1)
+    
+    def _timed(self, phase, started):
+        """Record the seconds since `started` for a send phase and return now."""
+        now = time.perf_counter()
+        self.last_timings[phase] = now - started
+        return now
+    
+    def send_message(self, phone, name, message=None):
+        """Send a message (with optional media) to a specific phone number.
+        
+        `message` is this contact's rendered text; it defaults to the raw
+        message template. If the browser died mid-send it is relaunched on
+        the same profile and the contact is retried once.
+        """
+        with self._driver_lock:
+            return self._send_supervised(phone, name, message)
+    
+    def _send_supervised(self, phone, name, message):
+        """send_message body: one attempt, plus a retry if the browser had to be relaunched."""
+        success = self._send_message(phone, name, message)
+        if self.last_error == "cancelled":
+            return False
+        if not success and self._browser_lost():
+            self.log(f"💥 Browser crashed while sending to {name}", level="error", contact=phone)
+            clicked = "send" in self.last_timings
+            if not self.recover_driver():
+                self.log("❌ Could not bring the browser back, stopping", level="error")
+                self.last_error = "browser"
+                self.should_stop = True
+            elif clicked:
+                # The message may already be out; a retry could send it twice
+                self.log(f"⚠️ Not retrying {name}: the crash came after the send click", level="warning", contact=phone)
+            else:
+                self.metrics.record_send(self.last_timings, False)
+                success = self._send_message(phone, name, message)
+        self.metrics.record_send(self.last_timings, success)
+        return success
+    
+    def _send_message(self, phone, name, message):
+        """Drive one send through the browser, timing each phase."""
+        text = self.message_template if message is None else message
+        self.last_timings = {}
+        self.last_error = None
+        clean_phone = None
+        try:
+            # Clean phone number
+            phone = str(phone).replace('.0', '')
+            clean_phone = ''.join(filter(str.isdigit, phone))
+            
+            if not clean_phone:
+                self.log(f"Skipping invalid phone number: {phone}")
+                return False
+
+            self.log(f"Sending to {name} ({clean_phone})...", contact=clean_phone)
+            self.progress.set(current=f"{name} ({clean_phone})")
+            
+            ready = self._take_prefetched(clean_phone) or self._open_chat(clean_phone)
+            mark = time.perf_counter()
+            self._remember_number(clean_phone, ready)
+            if ready == "invalid_number":
+                self.log(f"⚠️ Invalid number: {clean_phone}", level="warning", contact=clean_phone, phase="chat_open")
+                self.last_error = "invalid_number"
+                return False
+            if ready is None:
+                self.log(f"❌ Chat did not open for {name}", level="error", contact=clean_phone, phase="chat_open")
+                return False
+            input_box = self.driver.find_element(By.XPATH, COMPOSER_XPATH)
+            
+            # Case 1: Media attachment
+            if self.media_path and os.path.exists(self.media_path):
+                try:
+                    self.log(f"Attaching media: {os.path.basename(self.media_path)}", contact=clean_phone, phase="attach")
+                    
+                    # Click attach button (paperclip icon)
+                    attach_btn = self._wait_until(
+                        EC.element_to_be_clickable((By.XPATH, '//div[@title="Attach" or @aria-label="Attach"]')), 10
+                    )
+                    attach_btn.click()
+                    
+                    # Find and send file path to the hidden file input
+                    media_input = self._wait_until(
+                        EC.presence_of_element_located((By.XPATH, f'//input[@accept="{MEDIA_ACCEPT}"]')), 10
+                    )
+                    media_input.send_keys(os.path.abspath(self.media_path))
+                    mark = self._timed("attach", mark)
+                    
+                    # Wait for media preview to load
+                    if not self._wait_for(["media_ready"], 10):
+                        self.log(f"❌ Media preview did not load for {name}", level="error", contact=clean_phone, phase="media_ready")
+                        return False
+                    mark = self._timed("media_ready", mark)
+                    if self.media:
+                        self.media["uploads"] += 1
+                        self.media["upload_seconds"] += self.last_timings["attach"] + self.last_timings["media_ready"]
+                    
+                    # Add caption (message text) if provided
+                    if text:
+                        try:
+                            caption_box = self._wait_until(
+                                EC.presence_of_element_located((By.XPATH, COMPOSER_XPATH)), 10
+                            )
+                            if not self._insert_text(caption_box, text):
+                                self.log(f"❌ Caption did not match for {name}", level="error", contact=clean_phone, phase="type")
+                                self.last_error = "compose"
+                                return False
+                        except Exception as e:
+                            self.log(f"Warning: Could not add caption: {e}", level="warning", contact=clean_phone, phase="type")
+                    mark = self._timed("type", mark)
+                    
+                    # Click send button
+                    send_btn = self._wait_until(
+                        EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]')), 10
+                    )
+                    self.driver.execute_script("window.__waProbe && window.__waProbe.markOutgoing();")
+                    send_btn.click()
+                    self._timed("send", mark)
+                    self._sent(clean_phone, name)
+                    self.log(f"✅ Sent media + message to {name}", contact=clean_phone)
+                    self._log_timings(clean_phone)
+                    return True
+                    
+                except Exception as e:
+                    self.log(f"❌ Failed to send media: {e}", level="error", contact=clean_phone)
+                    return False
+            
+            # Case 2: Text-only message
+            else:
+                try:
+                    # Type message in input box
+                    if not self._insert_text(input_box, text):
+                        self.log(f"❌ Message did not match for {name}", level="error", contact=clean_phone, phase="type")
+                        self.last_error = "compose"
+                        return False
+                    mark = self._timed("type", mark)
+                    self.driver.execute_script("window.__waProbe && window.__waProbe.markOutgoing();")
+                    
+                    # Try to send message
+                    sent = False
+                    
+                    # Strategy 1: Click send icon
+                    try:
+                        send_button = self._wait_until(
+                            EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]')), 5
+                        )
+                        send_button.click()
+                        sent = True
+                    except Exception:
+                        pass
+                    
+                    # Strategy 2: Press Enter key
+                    if not sent:
+                        try:
+                            input_box.send_keys(Keys.RETURN)
+                            sent = True
+                        except Exception:
+                            pass
+                    
+                    if sent:
+                        self._timed("send", mark)
+                        self._sent(clean_phone, name)
+                        self.log(f"✅ Sent to {name}", contact=clean_phone)
+                        self._log_timings(clean_phone)
+                        return True
+                    else:
+                        self.log(f"❌ Failed to send to {name}", level="error", contact=clean_phone, phase="send")
+                        return False
+                        
+                except Exception as e:
+                    self.log(f"❌ Error sending text: {e}", level="error", contact=clean_phone)
+                    return False
+                
+        except SendCancelled:
+            self.log(f"⏸️ Interrupted before sending to {name}", contact=clean_phone)
+            self.last_error = "cancelled"
+            return False
+        except Exception as e:
+            self.log(f"❌ Error: {e}", level="error", contact=clean_phone)
+            return False
+    
+    def _open_chat(self, clean_phone):
+        """Open the chat for a number; returns "chat_open", "invalid_number" or None.
+        
+        In "in_app" mode the chat is opened through the new-chat search of the
+        already-loaded app, falling back to a full /send?phone= page load if
+        that does not work. Numbers the search cannot find (any number not
+        saved as a contact) count as failures too, since each one pays for
+        the search and then the full load anyway: after three misses in a
+        row the session sticks to full loads.
+        """
+        started = time.perf_counter()
+        if self.navigation == "in_app" and self._in_app_failures < 3:
+            ready = self._open_chat_in_app(clean_phone)
+            if ready in ("chat_open", "invalid_number"):
+                self._in_app_failures = 0
+                self._timed("chat_open", started)
+                return ready
+            self._in_app_failures += 1
+            if self._in_app_failures == 3:
+                self.log("⚠️ In-app navigation keeps missing, using full page loads", level="warning")
+        
+        # Navigate to chat (without message in URL for media support)
+        self._flush_outbox()
+        self._check_cancel()
+        url = f"{WHATSAPP_WEB_URL}/send?phone={clean_phone}"
+        self.driver.get(url)
+        mark = self._timed("navigate", started)
+        
+        # Proceed as soon as either the chat or the invalid-number dialog shows up
+        ready = self._wait_for(["chat_open", "invalid_number"], 20)
+        self._timed("chat_open", mark)
+        return ready
+    
+    def _remember_number(self, clean_phone, ready):
+        """Cache what opening a chat said about the number being on WhatsApp."""
+        if ready not in ("chat_open", "invalid_number"):
+            return
+        try:
+            self.number_registry.put(clean_phone, ready == "chat_open")
+        except Exception as e:
+            self.log(f"Warning: Could not cache number check: {e}", level="warning")
+    
+    def _prefetch(self, phone):
+        """Open the chat for the next contact ahead of time, during the pacing delay."""
+        clean_phone = "".join(filter(str.isdigit, str(phone).replace(".0", "")))
+        if not clean_phone:
+            return
+        saved, self.last_timings = self.last_timings, {}
+        try:
+            with self._driver_lock:
+                ready = self._open_chat(clean_phone)
+            self._prefetched = (clean_phone, ready, self.last_timings)
+        except (Exception, SendCancelled):
+            self._prefetched = None
+        finally:
+            self.last_timings = saved
+    
+    def _take_prefetched(self, clean_phone):
+        """The prefetched chat's state if it is for this number and still on screen, else None."""
+        prefetched, self._prefetched = self._prefetched, None
+        if not prefetched or prefetched[0] != clean_phone or prefetched[1] is None:
+            return None
+        _, ready, timings = prefetched
+        try:
+            if not self.driver.execute_script(f"return !!window.__waProbe && window.__waProbe.check('{ready}');"):
+                return None
+        except Exception:
+            return None
+        self.last_timings.update(timings)
+        return ready
+    
+    def _open_chat_in_app(self, clean_phone):
+        """Open a chat via the new-chat search without reloading the page.
+        
+        Returns "chat_open"/"invalid_number" on success, "not_found" if the
+        search had no match for the number, or None if the flow broke.
+        """
+        try:
+            if not self.driver.execute_script(OPEN_NEW_CHAT_JS, clean_phone):
+                return None
+            if self._wait_for(["search_box"], 3) is None:
+                return None
+            search_box = self.driver.find_element(By.XPATH, SEARCH_BOX_XPATH)
+            search_box.send_keys(clean_phone)
+            if self._wait_for(["search_result", "search_empty"], 5) != "search_result":
+                return "not_found"
+            search_box.send_keys(Keys.ENTER)
+            ready = self._wait_for(["chat_switched", "invalid_number"], 10)
+            return "chat_open" if ready == "chat_switched" else ready
+        except Exception:
+            return None
+    
+    def _insert_text(self, box, text):
+        """Put the whole message into a composer and confirm it landed intact.
+        
+        Tries a synthetic paste (one call, any characters, keeps line breaks),
+        then CDP Input.insertText per line with Shift+Enter between lines, and
+        finally plain send_keys, which cannot type characters outside the
+        Basic Multilingual Plane. Returns False if none matches `text`.
+        """
+        wanted = _comparable(text)
+        try:
+            if _comparable(self.driver.execute_script(PASTE_JS, box, text)) == wanted:
+                return True
+        except Exception:
+            pass
+        
+        for strategy in (self._insert_text_cdp, self._insert_text_keys):
+            try:
+                self.driver.execute_script(CLEAR_COMPOSER_JS, box)
+                strategy(box, text)
+                if _comparable(self.driver.execute_script(COMPOSER_TEXT_JS, box)) == wanted:
+                    return True
+            except Exception:
+                continue
+        return False
+    
+    def _insert_text_cdp(self, box, text):
+        """Insert text through DevTools, one line at a time."""
+        box.click()
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                ActionChains(self.driver).key_down(Keys.SHIFT).send_keys(Keys.ENTER).key_up(Keys.SHIFT).perform()
+            if line:
+                self.driver.execute_cdp_cmd("Input.insertText", {"text": line})
+    
+    def _insert_text_keys(self, box, text):
+        """Type text key by key (the original approach)."""
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                box.send_keys(Keys.SHIFT, Keys.ENTER)
+            box.send_keys(line)
+    
+    def _sent(self, clean_phone, name):
+        """Hand a just-sent message to the delivery tracker instead of waiting for its ticks."""
+        self._outbox_open = True
+        self.delivery.track(clean_phone, name, self.campaign)
+    
+    def _flush_outbox(self, cancellable=True):
+        """Before the page unloads, give the last sent message up to 5 s to leave the clock state.
+        
+        In-app navigation never unloads the page, so this only costs time on
+        full page loads and browser restarts, and by then the message has
+        usually long gone.
+        """
+        if not self._outbox_open:
+            return
+        self._outbox_open = False
+        started = time.perf_counter()
+        try:
+            ready = self._wait_for(["outbox_clear"], 5, cancellable)
+        except SendCancelled:
+            # The page stays put, so the message keeps draining; close() waits for it
+            self._outbox_open = True
+            raise
+        if not ready:
+            self.log("Warning: Last message still pending before leaving the page", level="warning", phase="outbox")
+        self._timed("outbox", started)
+    
+    def _read_chat_statuses(self):
+        """Status icon per chat in the chat list, read between sends; None if the browser is busy."""
+        if not self.driver or not self._driver_lock.acquire(timeout=1):
+            return None
+        try:
+            return self.driver.execute_script(CHAT_STATUSES_JS)
+        finally:
+            self._driver_lock.release()
+    
+    def _delivery_final(self, entry):
+        """Record a message's final delivery state in progress and the journal."""
+        key = "delivered" if entry["state"] == "delivered" else "unconfirmed"
+        self.progress.add(key)
+        if entry["state"] == "pending":
+            self.log(f"⚠️ Message to {entry['name']} never left the clock", level="warning", contact=entry["phone"])
+        try:
+            self._open_journal().record(entry["campaign"], entry["phone"], entry["name"], "delivery", delivery=entry["state"])
+        except Exception as e:
+            self.log(f"Warning: Could not write journal: {e}", level="warning")
+    
+    def _log_timings(self, contact=None):
+        """Log how long each phase of the last send took."""
+        self.log("⏱️ " + ", ".join(f"{k} {v:.2f}s" for k, v in self.last_timings.items()), level="debug", contact=contact)
+    
+    @property
+    def job_queue(self):
+        if self._job_queue is None:
+            self._job_queue = default_job_queue()
+        return self._job_queue
+    
+    @property
+    def number_registry(self):
+        if self._number_registry is None:
+            self._number_registry = default_number_registry()
+        return self._number_registry
+    
+    def start_checking(self, count=None, recheck=False):
+        """Check which of the top `count` valid contacts are on WhatsApp, sending nothing.
+        
+        Runs in the background like a campaign: each number's chat is opened
+        and classified as registered or not, and the verdict is cached in the
+        number registry, where campaigns look it up to skip invalid numbers
+        without loading their chat. Numbers with a cached verdict are not
+        opened again unless recheck=True. Returns False if no contacts are
+        loaded or the session is busy.
+        """
+        if self.contacts is None:
+            self.log("❌ No contacts loaded", level="error")
+            return False
+        with self._worker_lock:
+            if self.is_running:
+                self.log("⚠️ Session is busy with another campaign", level="warning")
+                return False
+            self.should_stop = False
+            self.paused = False
+            self.is_running = True
+        total = self.contacts.stats["valid"] if count is None else min(self.contacts.stats["valid"], count)
+        self.check_progress = Progress(
+            checked=0, total=total, current="",
+            registered=0, unregistered=0, unknown=0, cached=0,
+        )
+        thread = threading.Thread(target=self._check_loop, args=(total, recheck))
+        thread.daemon = True
+        thread.start()
+        return True
+    
+    def _check_loop(self, total, recheck):
+        """Open each contact's chat and record whether the number is on WhatsApp (check thread)."""
+        progress = self.check_progress
+        delay = float(os.environ.get("NUMBER_CHECK_DELAY", 1.0))
+        try:
+            self.log(f"🔎 Checking {total} numbers...")
+            contacts = itertools.islice(self.contacts.iter_valid(), total)
+            retry = None
+            while True:
+                if not self._hold():
+                    self.log("🛑 Stopped by user")
+                    break
+                contact, retry = retry or next(contacts, None), None
+                if contact is None:
+                    break
+                phone, name, _ = contact
+                clean_phone = "".join(filter(str.isdigit, phone))
+                progress.set(current=f"{name} ({clean_phone})")
+                known = None if recheck else self.number_registry.get(clean_phone)
+                if known is not None:
+                    progress.add("cached")
+                    progress.add("registered" if known else "unregistered")
+                    progress.add("checked")
+                    continue
+                
+                self.last_timings = {}
+                try:
+                    with self._driver_lock:
+                        ready = self._open_chat(clean_phone)
+                except SendCancelled:
+                    # Paused or stopped mid-check; _hold() decides whether it is tried again
+                    retry = contact
+                    continue
+                except Exception as e:
+                    self.log(f"❌ Check failed for {clean_phone}: {e}", level="error", contact=clean_phone)
+                    ready = None
+                if ready is None and self._browser_lost():
+                    self.log("❌ Stopped: no logged-in browser", level="error")
+                    break
+                self._remember_number(clean_phone, ready)
+                outcome = {"chat_open": "registered", "invalid_number": "unregistered"}.get(ready, "unknown")
+                progress.add(outcome)
+                progress.add("checked")
+                if ready == "invalid_number":
+                    self.log(f"⚠️ Not on WhatsApp: {clean_phone}", level="warning", contact=clean_phone)
+                
+                # Opening chats is read-only, so a short pause is enough
+                self._sleep(delay * random.uniform(0.5, 1.5))
+            
+            counts = progress.snapshot()
+            self.log(
+                f"✅ Check done: {counts['registered']} on WhatsApp, {counts['unregistered']} not, "
+                f"{counts['unknown']} unknown ({counts['cached']} from cache)"
+            )
+        except Exception as e:
+            self.log(f"❌ Error in check loop: {e}", level="error")
+        finally:
+            progress.set(current="")
+            with self._worker_lock:
+                self.is_running = False
+    
+    def start_sending(self, message, count, media_path=None, resume=False, priority=0, not_before=None):
+        """Queue a campaign for this session and make sure its worker is running.
+        
+        The top `count` valid contacts are rendered and stored in the job
+        queue, so a second campaign waits its turn instead of colliding with
+        the first, and queued sends survive a restart (call start_worker()
+        once the session is connected again). Higher `priority` campaigns go
+        first; `not_before` (Unix time) schedules a campaign for later.
+        
+        With resume=True, contacts the journal shows this same message already
+        reached are skipped. Returns False without queueing anything if no
+        contacts are loaded, the message uses placeholders the contact sheet
+        cannot fill, the media type is not one WhatsApp accepts, or the
+        session is busy with an orchestrated campaign.
+        
+        Reading and queueing the contacts happens in the background (see
+        `queueing`), so this returns as soon as the campaign is accepted.
+        """
+        if self.contacts is None:
+            self.log("❌ No contacts loaded", level="error")
+            return False
+        template = MessageTemplate(message)
+        try:
+            template.bind(self.contacts.header)
+            if media_path:
+                MediaStage.check(media_path)
+        except ValueError as e:
+            self.log(f"❌ {e}", level="error")
+            return False
+        if self._busy():
+            self.log("⚠️ Session is busy with another campaign", level="warning")
+            return False
+        
+        self.template = template
+        self.message_template = message
+        self.contact_count = count
+        self.resume = resume
+        
+        with self._worker_lock:
+            self._enqueuing += 1
+            stops = self._stops
+        thread = threading.Thread(
+            target=self._enqueue_campaign,
+            args=(template, message, count, media_path, resume, priority, not_before, stops)
+        )
+        thread.daemon = True
+        thread.start()
+        return True
+    
+    @property
+    def queueing(self):
+        """Whether a campaign's contacts are still being read into the queue."""
+        return self._enqueuing > 0
+    
+    def _enqueue_campaign(self, template, message, count, media_path, resume, priority, not_before, stops):
+        """Render and queue a campaign's contacts, then start the worker (enqueue thread).
+        
+        `stops` is the stop count when the campaign was accepted. A stop
+        issued while the contacts are still being queued cancels them (or,
+        with cancel=False, leaves them queued) and the worker is not started.
+        """
+        try:
+            total = min(self.contacts.stats["valid"], count)
+            contacts = itertools.islice(self.contacts.iter_valid(template=template), total)
+            campaign_id, queued = self.job_queue.enqueue(
+                self.session_id, contacts, message, media_path,
+                priority=priority, not_before=not_before, resume=resume,
+                cancelled=lambda: self._stops != stops and self._discard_claimed
+            )
+        except Exception as e:
+            self.log(f"❌ Could not queue campaign: {e}", level="error")
+            with self._worker_lock:
+                self._enqueuing -= 1
+            return
+        if self._stops != stops:
+            if queued:
+                self.log(f"📥 Queued campaign #{campaign_id}: {queued} contacts, not started (stopped)")
+            else:
+                self.log(f"Cancelled campaign #{campaign_id} while it was being queued")
+            with self._worker_lock:
+                self._enqueuing -= 1
+            return
+        when = f" for {time.strftime('%Y-%m-%d %H:%M', time.localtime(not_before))}" if not_before else ""
+        self.log(f"📥 Queued campaign #{campaign_id}: {queued} contacts{when}")
+        
+        with self._worker_lock:
+            if not self._worker_alive():
+                self.progress.reset(sent=0, total=0, current="", delivered=0, unconfirmed=0)
+            self.progress.add("total", queued)
+        if not self.start_worker(stops):
+            self.log("⚠️ Session is busy with another campaign; the contacts stay queued", level="warning")
+        with self._worker_lock:
+            self._enqueuing -= 1
+    
+    def _worker_alive(self):
+        return self._worker is not None and self._worker.is_alive()
+    
+    def _busy(self):
+        """Whether something other than this session's queue worker is driving the browser."""
+        with self._worker_lock:
+            return self.is_running and not self._worker_alive()
+    
+    def start_worker(self, stops=None):
+        """Start sending this session's queued jobs if the worker is not already running.
+        
+        Jobs a previous worker had claimed but not finished (e.g. before a
+        crash) go back in the queue first. Returns False if the session is
+        busy with an orchestrated campaign, or if `stops` (a stop count
+        taken earlier) shows a stop was requested since. A pause stays in
+        effect: the worker starts paused.
+        """
+        with self._worker_lock:
+            if stops is not None and self._stops != stops:
+                return False
+            if self._worker_alive():
+                return True
+            if self.is_running:
+                return False
+            requeued = self.job_queue.requeue_claimed(self.session_id)
+            if requeued:
+                self.log(f"↩️ Requeued {requeued} contacts left unfinished by an earlier run")
+            self.should_stop = False
+            self.is_running = True
+            self._worker = threading.Thread(target=self._send_loop)
+            self._worker.daemon = True
+            self._worker.start()
+            return True
+    
+    def _send_loop(self):
+        """Send this session's queued jobs until the queue is drained or stopped (worker thread)."""
+        me = threading.current_thread()
+        batch = []
+        prepared = {}  # media path -> MediaStage result, prepared once per worker
+        keys = {}  # campaign id -> journal campaign key
+        resumed = 0
+        invalid = 0
+        try:
+            self.log("🚀 Starting to send queued contacts...")
+            while self._hold():
+                if not batch:
+                    batch = self.job_queue.claim(self.session_id, self.claim_batch)
+                if not batch:
+                    with self._worker_lock:
+                        ready_at = self.job_queue.next_ready(self.session_id)
+                        if ready_at is None:
+                            # Retire under the lock so start_sending never counts on a worker that is leaving
+                            self._worker = None
+                            self.is_running = False
+                            break
+                    # Scheduled work only; wake up early if the queue changes
+                    self.job_queue.wait(min(max(ready_at - time.time(), 0.05), 1.0))
+                    continue
+                
+                job = batch.pop(0)
+                if not self._use_campaign(job, prepared, keys):
+                    self.job_queue.finish(job["id"], "failed")
+                    continue
+                
+                if job["resume"] and self.is_delivered(job["phone"]):
+                    resumed += 1
+                    self.progress.add("sent")
+                    self.job_queue.finish(job["id"], "skipped")
+                    continue
+                
+                if self.number_registry.is_invalid(job["phone"]):
+                    invalid += 1
+                    self.record_outcome(job["phone"], job["name"], False)
+                    self.job_queue.finish(job["id"], "skipped")
+                    continue
+                
+                success = self.send_message(job["phone"], job["name"], job["message"])
+                if self.last_error == "cancelled":
+                    # Stopped or paused before the send click; the contact is not done
+                    batch.insert(0, job)
+                    continue
+                if self.last_error == "browser":
+                    # Nothing left to send with; keep the contact for the next run
+                    self.job_queue.release([job["id"]])
+                    self._pace(success)
+                    continue
+                self.record_outcome(job["phone"], job["name"], success)
+                self.job_queue.finish(job["id"], "sent" if success else "failed")
+                
+                if success:
+                    self.progress.add("sent")
+                self._pace(success, upcoming=batch[0]["phone"] if batch else None)
+            
+            if self.should_stop:
+                if self.last_error == "browser":
+                    self.log("❌ Stopped: no logged-in browser", level="error")
+                else:
+                    self.log("🛑 Stopped by user")
+            if resumed:
+                self.log(f"⏭️ Skipped {resumed} contacts already delivered before")
+            if invalid:
+                self.log(f"⏭️ Skipped {invalid} numbers known not to be on WhatsApp")
+            self.log(f"✅ Done! Sent {self.progress['sent']}/{self.progress['total']} messages")
+            
+        except Exception as e:
+            self.log(f"❌ Error in send loop: {e}", level="error")
+        finally:
+            if batch and self.should_stop and self._discard_claimed:
+                for job in batch:
+                    self.job_queue.finish(job["id"], "cancelled")
+            elif batch:
+                self.job_queue.release([job["id"] for job in batch])
+            if self.journal:
+                self.journal.flush()
+            with self._worker_lock:
+                if self._worker is me:
+                    self._worker = None
+                    self.is_running = False
+    
+    def _use_campaign(self, job, prepared, keys):
+        """Switch message, media and journal key to the job's campaign; False if its media is unusable."""
+        path = job["media_path"]
+        if path:
+            if path not in prepared:
+                try:
+                    prepared[path] = self.prepare_media(path)
+                except Exception as e:
+                    self.log(f"❌ Campaign #{job['campaign_id']} media unusable, cancelling: {e}", level="error")
+                    self.job_queue.cancel(self.session_id, job["campaign_id"])
+                    return False
+            elif self.media_path != prepared[path]["path"]:
+                self.prepare_media(path, prepared[path])
+        else:
+            self.media_path = None
+            self.media = None
+        
+        if job["campaign_id"] not in keys:
+            keys[job["campaign_id"]] = campaign_key(job["template"], prepared[path]["path"] if path else None)
+        self.message_template = job["template"]
+        self.campaign = keys[job["campaign_id"]]
+        return True
+    
+    def prepare_media(self, media_path, prepared=None):
+        """Run the media stage once for this campaign and send the prepared file."""
+        if prepared is None:
+            prepared = MediaStage(log=self.log).prepare(media_path)
+            self.log(
+                f"📎 Media ready: {prepared['bytes'] // 1024} KB "
+                f"(saved {max(prepared['saved_bytes'], 0) // 1024} KB"
+                f"{', cached' if prepared['cached'] else ''})"
+            )
+        self.media = dict(prepared, uploads=0, upload_seconds=0.0)
+        self.media_path = prepared["path"]
+        return prepared
+    
+    def _open_journal(self):
+        if self.journal is None:
+            self.journal = SendJournal(f"./whatsapp_sessions/journals/session_{self.session_id}")
+        return self.journal
+    
+    def record_outcome(self, phone, name, success):
+        """Append a contact's outcome for the current campaign to the journal."""
+        try:
+            self._open_journal().record(self.campaign, phone, name, "sent" if success else "failed")
+        except Exception as e:
+            self.log(f"Warning: Could not write journal: {e}", level="warning")
+    
+    def is_delivered(self, phone):
+        """Whether the journal shows the current campaign already reached phone."""
+        return self._open_journal().is_delivered(self.campaign, phone)
+    
+    def _pace(self, success, upcoming=None):
+        """Wait between contacts as the rate controller dictates, returning early if stopped.
+        
+        This is also the safe point for the memory governor; time spent
+        restarting the browser counts toward the delay. In pipeline mode the
+        chat for `upcoming` (the next phone number) is opened during the
+        delay as well.
+        """
+        if self.last_error == "browser" or not self._govern_memory():
+            self.last_error = "browser"
+            self.should_stop = True
+            return
+        
+        # A bad number says nothing about how the session is coping
+        if self.last_error != "invalid_number":
+            # Messages stuck on the clock are the first sign of throttling
+            stuck = self.delivery.take_stuck()
+            rate_limited = (not success or stuck) and self._rate_limit_banner()
+            if rate_limited:
+                self.log("⚠️ Rate-limit banner detected, backing off", level="warning")
+            self.rate_controller.record(
+                success and self.last_error is None and not stuck,
+                latency=self.last_timings.get("chat_open"),
+                rate_limited=rate_limited
+            )
+        
+        delay = self.rate_controller.next_delay()
+        self.log(f"Waiting {delay:.1f}s... ({self.progress['sent']}/{self.progress['total']})", phase="delay")
+        
+        started = time.perf_counter()
+        if self.pipeline and upcoming and not self.should_stop and not self.paused:
+            self._prefetch(upcoming)
+        
+        remaining = delay - (time.perf_counter() - started)
+        if remaining > 0:
+            self._sleep(remaining)
+        self.metrics.record("delay", time.perf_counter() - started)
+    
+    def _rate_limit_banner(self):
+        """Whether WhatsApp is showing a sending-too-fast banner."""
+        try:
+            with self._driver_lock:
+                return bool(self.driver.execute_script("return !!window.__waProbe && window.__waProbe.check('rate_limited');"))
+        except Exception:
+            return False
+    
+    def stop_sending(self, cancel=True):
+        """Stop the sending process.
+        
+        Waits in progress are cut short, so the worker stops within about
+        half a second unless the browser is mid page load. A send already
+        clicked completes. With cancel=True the session's queued jobs are
+        dropped too; with cancel=False they stay queued for the next
+        start_worker().
+        """
+        with self._worker_lock:
+            self._discard_claimed = cancel
+            self._stops += 1  # Campaigns still being queued see this and do not start
+        with self._control:
+            # A stop supersedes a pause; the next start is not left paused
+            self._stop_requested = True
+            self.paused = False
+            self._control.notify_all()
+        if cancel:
+            cancelled = self.job_queue.cancel(self.session_id)
+            if cancelled:
+                self.log(f"Cancelled {cancelled} queued contacts")
+        self.job_queue.wake()
+        self.log("Stopping...")
+    
+    def get_status(self):
+        """Get current status."""
+        return {
+            "connected": self.is_connected,
+            "running": self.is_running,
+            "paused": self.paused,
+            "queueing": self.queueing,
+            "progress": self.progress.snapshot(),
+            "contacts": self.contacts.stats if self.contacts is not None else None,
+            "rate": self.rate_controller.snapshot(),
+            "media": self._media_status(),
+            "metrics": self.metrics.snapshot(),
+            "memory": self.memory_governor.snapshot(),
+            "crashes": self.crashes,
+            "delivery": self.delivery.counts(),
+            "queue": self.job_queue.stats(self.session_id),
+            "check": self.check_progress.snapshot() if self.check_progress else None,
+            "logs": self.logs.tail(20),  # Last 20 logs
+            "log_seq": self.logs.last_seq
+        }
+    
+    def _media_status(self):
+        """Bytes saved by the media stage and the average per-send upload time."""
+        if not self.media:
+            return None
+        uploads = self.media["uploads"]
+        return {
+            "original_bytes": self.media["original_bytes"],
+            "bytes": self.media["bytes"],
+            "saved_bytes": self.media["saved_bytes"],
+            "uploads": uploads,
+            "avg_upload_seconds": round(self.media["upload_seconds"] / uploads, 2) if uploads else None,
+        }
+    
+    def close(self):
+        """Close the browser."""
+        if self.driver:
+            with self._driver_lock:
+                self._flush_outbox(cancellable=False)
+        # Settle tracked messages while the journal they are recorded in is still open
+        self.delivery.close(self._read_chat_statuses())
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.driver:
+            if self._pooled:
+                # Hand back to the pool; a browser that never logged in can be reused as-is
+                if self.driver_pool.release(self.driver, self.session_dir, reusable=not self.is_connected):
+                    # The profile went back to the pool; this session starts from its own again
+                    try:
+                        os.remove(self._profile_marker())
+                    except OSError:
+                        pass
+                    self.session_dir = f"./whatsapp_sessions/session_{self.session_id}"
+                self._pooled = False
+            else:
+                self.driver.quit()
+            self.driver = None
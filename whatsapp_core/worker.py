@@ -0,0 +1,335 @@
+"""Run a session's browser and send loop in its own OS process."""
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from .browser import current_profile, use_profile
+from .contacts import UPLOAD_DIR, spool_upload
+from .logs import LogBuffer
+
+# Sequence number (odd while a write is in progress) and payload length
+HEADER = struct.Struct("<QI")
+
+
+def open_session(session_id, **options):
+    """A WhatsAppService, or a SessionProcess when WHATSAPP_WORKERS=process."""
+    if os.environ.get("WHATSAPP_WORKERS") == "process":
+        # A browser pool lives in this process and cannot be handed to another one
+        options.pop("driver_pool", None)
+        return SessionProcess(session_id, **options).start()
+    from .service import WhatsAppService
+    return WhatsAppService(session_id, **options)
+
+
+class StatusChannel:
+    """Latest status snapshot of one session, as JSON in a shared memory block.
+
+    Writers (serialized by a lock) replace the snapshot as a whole; readers
+    in any process copy it out without locks or round trips, retrying if
+    they raced a write (a seqlock: the sequence number is odd while the
+    payload changes).
+    """
+
+    def __init__(self, name=None, size=64 * 1024):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER.size + size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = self.shm.size - HEADER.size
+        self._seq = 0
+        self._write_lock = threading.Lock()  # Several worker threads publish
+
+    def write(self, status):
+        """Publish a status dict, dropping the log tail if it does not fit."""
+        payload = json.dumps(status, default=str).encode()
+        if len(payload) > self.capacity:
+            payload = json.dumps(dict(status, logs=[]), default=str).encode()
+        if len(payload) > self.capacity:
+            payload = json.dumps({"error": "status too large"}).encode()
+        buf = self.shm.buf
+        with self._write_lock:
+            self._seq += 1
+            HEADER.pack_into(buf, 0, self._seq, 0)
+            buf[HEADER.size:HEADER.size + len(payload)] = payload
+            self._seq += 1
+            HEADER.pack_into(buf, 0, self._seq, len(payload))
+
+    def read(self):
+        """The last published status, or None if nothing was published yet."""
+        buf = self.shm.buf
+        for _ in range(100):
+            seq, length = HEADER.unpack_from(buf, 0)
+            if seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            payload = bytes(buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] == seq:
+                return json.loads(payload)
+        return None
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _session_main(session_id, options, profile, channel_name, interval, commands, events):
+    """Worker process: own one WhatsAppService and serve commands until closed."""
+    from .service import WhatsAppService
+
+    use_profile(profile)
+    channel = StatusChannel(channel_name)
+    service = WhatsAppService(session_id, echo_logs=False, **options)
+    closed = threading.Event()
+
+    log = service.log
+
+    def forward_log(message, level="info", contact=None, phase=None):
+        log(message, level, contact, phase)
+        events.put(("log", message, level, contact, phase))
+    service.log = forward_log
+
+    def publish():
+        try:
+            channel.write(dict(service.get_status(), pid=os.getpid(), published=time.time()))
+        except Exception as e:
+            log(f"Warning: Could not publish status: {e}", level="warning")
+
+    def publisher():
+        while not closed.wait(interval):
+            publish()
+
+    def run(call_id, name, args, kwargs):
+        # Commands run side by side, as they would on a threaded web server
+        try:
+            result = (True, getattr(service, name)(*args, **kwargs))
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+        # Publish first, so a get_status() right after the call sees its effect
+        publish()
+        events.put(("result", call_id) + result)
+
+    publish()
+    publishing = threading.Thread(target=publisher)
+    publishing.daemon = True
+    publishing.start()
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            call_id, name, args, kwargs = command
+            if name == "close":
+                run(call_id, name, args, kwargs)
+                break
+            thread = threading.Thread(target=run, args=command)
+            thread.daemon = True
+            thread.start()
+    finally:
+        closed.set()
+        try:
+            if service.is_running:
+                service.stop_sending(cancel=False)
+            service.close()
+        except Exception:
+            pass
+        publishing.join()
+        publish()
+        channel.close()
+        events.put(("exit",))
+
+
+class SessionProcess:
+    """One WhatsApp session run in a separate OS process.
+
+    The worker owns the browser, the send loop and every other thread of a
+    WhatsAppService, so sessions no longer share one interpreter and a hung
+    WebDriver call stalls only its own session. Commands go to the worker
+    over a queue and run there; the worker publishes its status to a
+    StatusChannel twice a second and forwards log records as they happen.
+    get_status() and get_logs() are answered from those copies without
+    waiting on the worker.
+
+    `options` are passed to WhatsAppService in the worker and must be
+    picklable.
+    """
+
+    def __init__(self, session_id, status_interval=0.5, call_timeout=120, **options):
+        self.session_id = session_id
+        self.options = options
+        self.status_interval = status_interval
+        self.call_timeout = call_timeout  # Seconds to wait for a command's result
+        self.logs = LogBuffer(int(os.environ.get("LOG_CAPACITY", 1000)))
+        # The worker never prints; its records are echoed here instead
+        echo_logs = options.pop("echo_logs", None)
+        self.echo_logs = not os.environ.get("WHATSAPP_QUIET") if echo_logs is None else echo_logs
+        self.process = None
+        self.channel = None
+        self._context = multiprocessing.get_context("spawn")
+        self._commands = None
+        self._events = None
+        self._calls = itertools.count(1)
+        self._results = {}
+        self._results_changed = threading.Condition()
+        self._pump = None
+
+    def start(self):
+        """Spawn the worker process; returns self."""
+        if self.process is not None and self.process.is_alive():
+            return self
+        self.channel = StatusChannel(size=int(os.environ.get("WORKER_STATUS_BYTES", 64 * 1024)))
+        self._commands = self._context.Queue()
+        self._events = self._context.Queue()
+        self.process = self._context.Process(
+            target=_session_main,
+            args=(self.session_id, self.options, current_profile(), self.channel.name,
+                  self.status_interval, self._commands, self._events),
+            name=f"whatsapp-session-{self.session_id}",
+        )
+        self.process.daemon = True
+        self.process.start()
+        self._pump = threading.Thread(target=self._pump_events, args=(self.process, self._events))
+        self._pump.daemon = True
+        self._pump.start()
+        return self
+
+    def _pump_events(self, process, events):
+        """Copy logs and command results out of the worker's event queue."""
+        while True:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+                continue
+            if event[0] == "log":
+                self.logs.append(*event[1:])
+                if self.echo_logs:
+                    print(event[1])
+            elif event[0] == "result":
+                with self._results_changed:
+                    self._results[event[1]] = event[2:]
+                    self._results_changed.notify_all()
+            elif event[0] == "exit":
+                break
+        with self._results_changed:
+            self._results_changed.notify_all()
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def call(self, name, *args, timeout=None, **kwargs):
+        """Run a WhatsAppService method in the worker and return its result."""
+        if not self.alive():
+            raise RuntimeError(f"Session {self.session_id} worker is not running")
+        call_id = next(self._calls)
+        self._commands.put((call_id, name, args, kwargs))
+        deadline = time.time() + (self.call_timeout if timeout is None else timeout)
+        with self._results_changed:
+            while call_id not in self._results:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"Session {self.session_id} worker did not answer {name}")
+                if not self.alive():
+                    raise RuntimeError(f"Session {self.session_id} worker exited during {name}")
+                self._results_changed.wait(min(remaining, 1.0))
+            ok, result = self._results.pop(call_id)
+        if not ok:
+            raise RuntimeError(f"{name} failed in session {self.session_id} worker: {result}")
+        return result
+
+    def setup_driver(self):
+        return self.call("setup_driver")
+
+    def check_connection(self):
+        return self.call("check_connection")
+
+    def get_state(self):
+        return self.call("get_state")
+
+    def get_qr_code(self):
+        return self.call("get_qr_code")
+
+    def wait_for_qr_change(self, version, timeout=25):
+        return self.call("wait_for_qr_change", version, timeout, timeout=timeout + 30)
+
+    def load_contacts(self, file_content):
+        """Spool the upload to disk here and hand the worker only its path."""
+        try:
+            path = os.path.abspath(spool_upload(file_content, UPLOAD_DIR))
+        except Exception as e:
+            self.logs.append(f"Error loading contacts: {e}", "error")
+            return False
+        return self.call("load_contacts_file", path)
+
+    def start_sending(self, message, count, media_path=None, resume=False, priority=0, not_before=None):
+        return self.call("start_sending", message, count, media_path, resume, priority, not_before)
+
+    def start_checking(self, count=None, recheck=False):
+        return self.call("start_checking", count, recheck)
+
+    def start_worker(self):
+        return self.call("start_worker")
+
+    def stop_sending(self, cancel=True):
+        return self.call("stop_sending", cancel)
+
+    def pause_sending(self):
+        return self.call("pause_sending")
+
+    def resume_sending(self):
+        return self.call("resume_sending")
+
+    def get_logs(self, since=0, limit=None):
+        """Structured log records after sequence number `since` (see WhatsAppService.get_logs)."""
+        records, last, missed = self.logs.since(since, limit)
+        return {"logs": records, "next": last, "missed": missed}
+
+    def get_status(self):
+        """The worker's last published status, read from shared memory."""
+        status = (self.channel.read() if self.channel else None) or {}
+        published = status.pop("published", None)
+        status.update({
+            "logs": self.logs.tail(20),
+            "log_seq": self.logs.last_seq,
+            "worker": {
+                "pid": self.process.pid if self.process else None,
+                "alive": self.alive(),
+                "exitcode": self.process.exitcode if self.process else None,
+                "age": round(time.time() - published, 2) if published else None,
+            },
+        })
+        return status
+
+    @property
+    def is_connected(self):
+        return bool(self.get_status().get("connected"))
+
+    @property
+    def is_running(self):
+        return bool(self.get_status().get("running"))
+
+    def close(self, timeout=30):
+        """Close the browser and end the worker process."""
+        if self.alive():
+            try:
+                self.call("close", timeout=timeout)
+            except Exception:
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(5)
+        if self.channel:
+            self.channel.close(unlink=True)
+            self.channel = None